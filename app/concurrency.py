@@ -0,0 +1,53 @@
+"""
+Running blocking I/O without blocking the event loop.
+"""
+import functools
+from contextlib import asynccontextmanager
+from contextvars import copy_context
+from typing import AsyncIterator, Callable, Hashable, TypeVar
+
+from anyio import CapacityLimiter, Lock, to_thread
+from anyio.lowlevel import RunVar
+
+from app.settings.repository import get_repo_settings
+
+ResultT = TypeVar("ResultT")
+
+# Limits the number of threads doing blocking I/O, per event loop
+_io_limiter: RunVar[CapacityLimiter] = RunVar("io_limiter")
+# Locks that let one writer at a time change what they guard, like a repository, per event loop
+_write_locks: RunVar[dict[Hashable, Lock]] = RunVar("write_locks")
+
+
+async def run_blocking(func: Callable[..., ResultT], *args, **kwargs) -> ResultT:
+    """Run a blocking function in the bounded I/O thread pool"""
+    context = copy_context()
+    return await to_thread.run_sync(functools.partial(context.run, func, *args, **kwargs), limiter=_get_io_limiter())
+
+
+@asynccontextmanager
+async def write_lock(key: Hashable) -> AsyncIterator[None]:
+    """
+    Hold the write lock of a key, like a repository class, so the writes to it run one at a time.
+
+    A writer holds the lock from loading what it changes until the changes are saved, so concurrent writers do not
+    save changes made to the same loaded version and overwrite each other. Reads do not take the lock.
+    """
+    try:
+        write_locks = _write_locks.get()
+    except LookupError:
+        write_locks = {}
+        _write_locks.set(write_locks)
+
+    async with write_locks.setdefault(key, Lock()):
+        yield
+
+
+def _get_io_limiter() -> CapacityLimiter:
+    try:
+        return _io_limiter.get()
+    except LookupError:
+        settings = get_repo_settings()
+        limiter = CapacityLimiter(settings.io_max_threads)
+        _io_limiter.set(limiter)
+        return limiter
@@ -13,3 +13,7 @@ class NotFoundError(ValidationError):
 
 class AlreadyExistsError(ValidationError):
     """Raised when an asset already exists."""
+
+
+class WriteConflictError(Exception):
+    """Raised when a stored asset was changed by another writer since it was loaded."""
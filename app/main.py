@@ -1,10 +1,11 @@
 """Main entrypoint for the application."""
-import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
 
-from app.routers import goals, matches, opponents, players, stats
+from app.metrics import ServerTimingMiddleware
+from app.routers import goals, matches, metrics, opponents, players, stats
+from app.s3 import S3AssetBucket
 from app.settings.api import get_api_settings
 
 
@@ -18,6 +19,7 @@ def get_app() -> FastAPI:
     server.include_router(matches.router, prefix="/matches")
     server.include_router(opponents.router, prefix="/opponents")
     server.include_router(players.router, prefix="/players")
+    server.include_router(metrics.router, prefix="/metrics")
 
     server.add_middleware(
         CORSMiddleware,
@@ -26,13 +28,26 @@ def get_app() -> FastAPI:
         allow_methods=api_settings.http_allowed_methods,
         allow_headers=api_settings.http_allowed_headers,
     )
+    server.add_middleware(ServerTimingMiddleware)
+    server.add_event_handler("shutdown", S3AssetBucket.flush_uploads)
     return server
 
 
 app = get_app()
 
-handler = Mangum(app)
+_mangum_handler = Mangum(app)
+
+
+def handler(event, context):
+    """Handle an AWS Lambda invocation, flushing the deferred uploads before the invocation is frozen"""
+    try:
+        return _mangum_handler(event, context)
+    finally:
+        S3AssetBucket.flush_uploads()
 
 
 if __name__ == "__main__":
+    # Only needed to run the API locally, so it does not slow down the cold start on AWS Lambda
+    import uvicorn  # pylint: disable=import-outside-toplevel
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
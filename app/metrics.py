@@ -0,0 +1,125 @@
+"""
+Timing of the phases that make up a request.
+
+Every timed phase is added to a histogram of the process, which is exposed in the Prometheus text format, and to the
+timings of the current request, which are sent back in a Server-Timing header.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Upper bounds of the histogram buckets, in seconds
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Total duration in seconds of each phase in the current request, if a request is being timed
+_request_timings: ContextVar[Optional[dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Durations in seconds, counted in cumulative buckets per label value like a Prometheus histogram"""
+
+    def __init__(self, name: str, description: str, label: str):
+        self.name = name
+        self.description = description
+        self.label = label
+        self._observations: dict[str, tuple[list[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, duration: float):
+        """Count a duration in the buckets of the label value"""
+        with self._lock:
+            bucket_counts, total = self._observations.get(label_value) or ([0] * (len(_BUCKETS) + 1), 0.0)
+            bucket_counts[bisect_left(_BUCKETS, duration)] += 1
+            self._observations[label_value] = (bucket_counts, total + duration)
+
+    def clear(self):
+        """Forget all observations"""
+        with self._lock:
+            self._observations.clear()
+
+    def render(self) -> list[str]:
+        """Render the histogram in the Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            observations = sorted((key, (list(counts), total)) for key, (counts, total) in self._observations.items())
+
+        for label_value, (bucket_counts, total) in observations:
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative_count = 0
+            for upper_bound, count in zip((*map(str, _BUCKETS), "+Inf"), bucket_counts):
+                cumulative_count += count
+                lines.append(f'{self.name}_bucket{{{label},le="{upper_bound}"}} {cumulative_count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative_count}")
+        return lines
+
+
+phase_durations = Histogram("futsta_phase_duration_seconds", "Duration of the phases of requests.", "phase")
+request_durations = Histogram("futsta_request_duration_seconds", "Duration of requests.", "route")
+
+
+@contextmanager
+def timed(phase: str):
+    """Time a phase, as a context manager or as a decorator"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        phase_durations.observe(phase, duration)
+        if (timings := _request_timings.get()) is not None:
+            timings[phase] = timings.get(phase, 0.0) + duration
+
+
+def render_metrics() -> str:
+    """Render all metrics in the Prometheus text format"""
+    lines = phase_durations.render() + request_durations.render()
+    return "\n".join(lines) + "\n"
+
+
+def clear_metrics():
+    """Forget all timed phases and requests"""
+    phase_durations.clear()
+    request_durations.clear()
+
+
+class ServerTimingMiddleware:
+    """Time each HTTP request, adding the duration of its phases to the response in a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_server_timing(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = time.perf_counter() - start
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _format_server_timing(timings).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            _request_timings.reset(token)
+            endpoint = scope.get("endpoint")
+            request_durations.observe(getattr(endpoint, "__name__", "unknown"), time.perf_counter() - start)
+
+
+def _format_server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{phase};dur={duration * 1000:.1f}" for phase, duration in timings.items())
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+
+from app.models.goals import CountType
+from app.models.players import Player
+
+
+class PlayerCount(BaseModel):
+    """The number of goals and assists of a player"""
+
+    player: Player
+    goals: int = 0
+    assists: int = 0
+
+    def get(self, count_type: CountType) -> int:
+        """Return the number of goals or assists"""
+        if count_type is CountType.GOAL:
+            return self.goals
+        if count_type is CountType.ASSIST:
+            return self.assists
+        raise NotImplementedError(f"Invalid count_type {count_type}")
+
+    def __str__(self):
+        return f"Counts of {self.player.name}"
@@ -6,12 +6,17 @@ class Player(BaseModel):
 
     name: str
 
+    @property
+    def key(self) -> str:
+        """Return the normalized name, which identifies the player regardless of its capitalization"""
+        return self.name.lower()
+
     def __hash__(self):
-        return hash(self.name)
+        return hash(self.key)
 
     def __eq__(self, other):
         if isinstance(other, Player):
-            return self.name.lower() == other.name.lower()
+            return self.key == other.key
         return NotImplemented
 
     def __str__(self):
@@ -0,0 +1,28 @@
+from enum import Enum
+
+from pydantic import BaseModel
+
+from app.models.goals import Goal, Score
+from app.models.matches import Match
+from app.models.player_counts import PlayerCount
+
+
+class MatchResult(str, Enum):
+    """The result of a match for the team"""
+
+    WIN = "win"
+    DRAW = "draw"
+    LOSS = "loss"
+
+
+class MatchTimeline(BaseModel):
+    """The goals of a match in the order they were scored, each with the score after it"""
+
+    match: Match
+    goals: list[Goal] = []
+    player_counts: list[PlayerCount] = []
+    score: Score
+    result: MatchResult
+
+    def __str__(self):
+        return f"Timeline of {str(self.match).lower()}"
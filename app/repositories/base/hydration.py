@@ -0,0 +1,124 @@
+"""Building models from data they were serialized to by the repositories themselves, without validating it again"""
+import gc
+from contextlib import contextmanager
+from datetime import date
+from functools import lru_cache, partial
+from typing import Any, Callable, TypeVar, Union, get_args, get_origin
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+from pydantic.utils import lenient_issubclass
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+_PLAIN_TYPES = (str, int, float, bool)
+
+
+class HydrationError(ValueError):
+    """Raised when data can not be trusted to be the serialization of a model"""
+
+
+def construct_trusted(model_class: type[ModelT], data: dict) -> ModelT:
+    """
+    Build a model, and its nested models, from data it was serialized to, without running its validators.
+
+    Values of types that can not be built directly are validated by their field, like pydantic would.
+    """
+    with _gc_paused():
+        return _get_constructor(model_class)(data)
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Pause the garbage collector while building many models at once.
+
+    None of the new objects are garbage, but their number triggers full collections that take longer than building them.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+@lru_cache(maxsize=None)
+def _get_constructor(model_class: type[ModelT]) -> Callable[[dict], ModelT]:
+    """Plan once per model class how to build each field, so building many models only runs the planned steps"""
+    fields = [(name, field.alias, _get_field_converter(field), field) for name, field in model_class.__fields__.items()]
+
+    def construct(data: dict) -> ModelT:
+        values = {}
+        fields_set = set()
+        for name, alias, convert, field in fields:
+            if alias in data:
+                value = data[alias]
+                values[name] = None if value is None else convert(value)
+                fields_set.add(name)
+            elif not field.required:
+                values[name] = field.get_default()
+            else:
+                raise HydrationError(f"Missing value for {name}")
+
+        model = model_class.__new__(model_class)
+        object.__setattr__(model, "__dict__", values)
+        object.__setattr__(model, "__fields_set__", fields_set)
+        model._init_private_attributes()  # pylint: disable=protected-access
+        return model
+
+    return construct
+
+
+def _get_field_converter(field: ModelField) -> Callable[[Any], Any]:
+    if field.shape == SHAPE_LIST and field.sub_fields:
+        convert_item = _get_field_converter(field.sub_fields[0])
+        return partial(_convert_list, convert_item, field)
+    if field.shape != SHAPE_SINGLETON:
+        return partial(_validate, field)
+
+    type_ = field.type_
+    if get_origin(type_) is Union:
+        model_classes = [arg for arg in get_args(type_) if lenient_issubclass(arg, BaseModel)]
+        type_ = model_classes[0] if len(model_classes) == 1 else type_
+
+    if lenient_issubclass(type_, BaseModel):
+        return partial(_convert_model, type_, field)
+    if type_ is date:
+        return partial(_convert_date, field)
+    if type_ in _PLAIN_TYPES:
+        return partial(_convert_plain, type_, field)
+    return partial(_validate, field)
+
+
+def _convert_list(convert_item: Callable[[Any], Any], field: ModelField, value: Any) -> list:
+    if not isinstance(value, list):
+        return _validate(field, value)
+    return [convert_item(item) for item in value]
+
+
+def _convert_model(model_class: type[BaseModel], field: ModelField, value: Any) -> Any:
+    if not isinstance(value, dict):
+        return _validate(field, value)
+    return _get_constructor(model_class)(value)
+
+
+def _convert_date(field: ModelField, value: Any) -> Any:
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return _validate(field, value)
+
+
+def _convert_plain(type_: type, field: ModelField, value: Any) -> Any:
+    if type(value) is not type_:  # pylint: disable=unidiomatic-typecheck
+        return _validate(field, value)
+    return value
+
+
+def _validate(field: ModelField, value: Any) -> Any:
+    validated, errors = field.validate(value, {}, loc=field.name)
+    if errors:
+        raise HydrationError(f"Invalid value for {field.name}: {value!r}")
+    return validated
@@ -1,68 +1,265 @@
 """Base class for repositories"""
-import json
 from abc import ABC
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Callable, NamedTuple, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
+from app.concurrency import run_blocking
+from app.metrics import timed
+from app.repositories.base.session import RepositorySession
+from app.repositories.base.storage import (
+    FileBodies,
+    Operation,
+    Storage,
+    clear_content_hashes,
+    get_storage,
+    retry_on_write_conflict,
+)
 from app.repositories.base.validators import assert_in
 from app.s3 import S3AssetBucket
 from app.settings.repository import get_repo_settings
 
 
-class JsonRepository(BaseModel, ABC):
-    """Base class for repositories that store data in json files"""
+class _CacheEntry(NamedTuple):
+    fingerprint: tuple
+    repo: "JsonRepository"
+
+
+class _ChangeCheck(NamedTuple):
+    # Prepares the asset before it is validated, again when the change is made on top of the changes of another writer
+    prepare: Optional[Callable[[], object]]
+    validators: set[callable]
+
+
+# Process-wide cache of loaded repositories, keyed by repository class
+_REPOSITORY_CACHE: dict[type, _CacheEntry] = {}
+
+
+class JsonRepository(BaseModel, ABC):  # pylint: disable=too-many-instance-attributes
+    """Base class for repositories that store data in json files, or in a SQLite database, see the storage module"""
 
     assets: list[BaseModel] = []
+    version: int = 0
+
+    # Changes made since the repository was loaded or last saved, and how they were prepared and validated
+    _changes: list[tuple[Operation, BaseModel]] = PrivateAttr(default_factory=list)
+    _change_checks: list[_ChangeCheck] = PrivateAttr(default_factory=list)
+    # Number of operations in the journal that are not compacted into the json file yet
+    _journal_length: int = PrivateAttr(default=0)
+    # Row id in the SQLite database of every asset, by the id of the asset object
+    _row_ids: dict[int, int] = PrivateAttr(default_factory=dict)
+    # Number of nested batches, which postpone committing the changes
+    _batch_depth: int = PrivateAttr(default=0)
+    # Keys of the shards that were loaded, when not all shards were loaded
+    _shard_keys: Optional[set[str]] = PrivateAttr(default=None)
+    # ETag of every stored file the repository was loaded from, or None for the files that did not exist, by file name
+    _etags: dict[str, Optional[str]] = PrivateAttr(default_factory=dict)
 
     # pylint: disable=too-few-public-methods
     class Config:
         """Pydantic config"""
 
         json_file_name: str
+        # Attribute of the assets to store them by in one json file per value, in the sharded storage mode
+        shard_attribute: Optional[str] = None
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._build_indexes()
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name == "assets":
+            self._build_indexes()
 
-    def add(self, asset: BaseModel, validators: Optional[set[callable]] = None):
-        """Add asset to repository"""
+    def __contains__(self, asset: BaseModel) -> bool:
+        return asset in self.assets
+
+    def add(
+        self,
+        asset: BaseModel,
+        validators: Optional[set[callable]] = None,
+        session: Optional[RepositorySession] = None,
+        prepare: Optional[Callable[[], object]] = None,
+    ):
+        """
+        Add asset to repository.
+
+        The prepare callable completes the asset before it is validated, like a score that follows from the other
+        assets. It is called again when the asset is added on top of the changes of another writer.
+        """
         validators = validators or []
 
-        self._validate(asset, validators)
+        if prepare:
+            prepare()
+        self._validate(asset, validators, session)
 
-        self.assets.append(asset)
-        self.save()
+        self._apply(Operation.ADD, asset)
+        self._changes.append((Operation.ADD, asset))
+        self._change_checks.append(_ChangeCheck(prepare, validators))
+        self._commit()
 
-    def remove(self, asset: BaseModel, validators: Optional[set[callable]] = None):
+    def remove(
+        self,
+        asset: BaseModel,
+        validators: Optional[set[callable]] = None,
+        session: Optional[RepositorySession] = None,
+    ):
         """Remove asset from repository"""
         validators = validators or set()
         validators.add(assert_in)
 
-        self._validate(asset, validators)
+        self._validate(asset, validators, session)
+
+        removed_asset = self._apply(Operation.REMOVE, asset)
+        self._changes.append((Operation.REMOVE, removed_asset))
+        self._change_checks.append(_ChangeCheck(None, validators))
+        self._commit()
+
+    async def add_async(
+        self,
+        asset: BaseModel,
+        validators: Optional[set[callable]] = None,
+        session: Optional[RepositorySession] = None,
+        prepare: Optional[Callable[[], object]] = None,
+    ):
+        """Add asset to repository, without blocking the event loop"""
+        await run_blocking(self.add, asset, validators, session, prepare)
 
-        self.assets.remove(asset)
-        self.save()
+    async def remove_async(
+        self,
+        asset: BaseModel,
+        validators: Optional[set[callable]] = None,
+        session: Optional[RepositorySession] = None,
+    ):
+        """Remove asset from repository, without blocking the event loop"""
+        await run_blocking(self.remove, asset, validators, session)
+
+    @contextmanager
+    def batch(self):
+        """Commit the changes made within the context at once, or roll them back on error"""
+        assets, version, change_count = list(self.assets), self.version, len(self._changes)
+
+        self._batch_depth += 1
+        try:
+            yield self
+        except Exception:
+            self.assets = assets
+            self.version = version
+            del self._changes[change_count:]
+            del self._change_checks[change_count:]
+            raise
+        finally:
+            self._batch_depth -= 1
+
+        self._commit()
 
     @classmethod
     def load(cls):
         """Load model from json"""
+        # pylint: disable=protected-access
         settings = get_repo_settings()
 
         if not settings.local_access:
             raise PermissionError("No local access")
 
+        storage = get_storage(cls)
         repo = cls()
         repo._download()
+        etags = repo._get_known_etags()
+
+        if not (fingerprint := storage.fingerprint()):
+            repo._etags = etags
+            return repo
+
+        cached = _REPOSITORY_CACHE.get(cls)
+        if settings.repository_cache and cached and cached.fingerprint == fingerprint:
+            repo = cached.repo._clone()
+            repo._etags = etags
+            return repo
+
+        repo = storage.read()
+        repo._update_cache(fingerprint)
+        repo._etags = etags
+        return repo
+
+    @classmethod
+    async def load_async(cls):
+        """Load model from json, without blocking the event loop"""
+        return await run_blocking(cls.load)
+
+    @classmethod
+    def load_shard(cls, shard_key: str):
+        """
+        Load only the assets of one shard, when the repository is stored in shards, or else the whole repository.
+
+        Changes to the assets of the shard can be committed as usual, since the other shards are left untouched.
+        """
+        settings = get_repo_settings()
+
+        if not settings.local_access:
+            raise PermissionError("No local access")
+
+        if not get_storage(cls).sharded:
+            return cls.load()
+        return cls._load_shards([shard_key])
+
+    @classmethod
+    async def load_shard_async(cls, shard_key: str):
+        """Load only the assets of one shard, without blocking the event loop"""
+        return await run_blocking(cls.load_shard, shard_key)
+
+    @classmethod
+    def get_content_hash(cls, shard_key: Optional[str] = None) -> Optional[str]:
+        """
+        Return a hash of the stored repository without loading it, or None when nothing is stored yet.
+
+        When the repository is stored in shards, the hash of only the given shard can be returned instead.
+        """
+        settings = get_repo_settings()
 
-        if repo.json_exists():
-            json_data = repo._read_json_data()
-            return cls(**json_data)
-        return cls()
+        if not settings.local_access:
+            raise PermissionError("No local access")
+
+        repo = cls()
+        # The hashes of the shards are in their index, so no shards are downloaded
+        repo._download(shard_keys=[])
+        return repo.storage.content_hash(shard_key)
+
+    @classmethod
+    async def get_content_hash_async(cls, shard_key: Optional[str] = None) -> Optional[str]:
+        """Return a hash of the stored repository without loading it, and without blocking the event loop"""
+        return await run_blocking(cls.get_content_hash, shard_key)
+
+    @classmethod
+    def clear_cache(cls):
+        """Clear the cached repository of this class, or all cached repositories when called on the base class"""
+        if cls is JsonRepository:
+            _REPOSITORY_CACHE.clear()
+            clear_content_hashes()
+        else:
+            _REPOSITORY_CACHE.pop(cls, None)
+            clear_content_hashes(cls)
 
     def save(self):
-        """Save model to json"""
+        """
+        Save model to json, compacting the journal into it, or replace all its rows in the SQLite database or all its
+        loaded shards
+        """
         settings = get_repo_settings()
         if settings.local_access:
-            self._write_json_data()
-            self._upload()
+            self._persist()
+            self._after_save(self._take_changes())
+
+    async def save_async(self):
+        """Save model to json, without blocking the event loop"""
+        await run_blocking(self.save)
+
+    def is_stored(self) -> bool:
+        """Check if the repository is stored locally"""
+        return bool(self.storage.fingerprint())
 
     def json_exists(self):
         """Check if json file exists"""
@@ -74,26 +271,154 @@ class JsonRepository(BaseModel, ABC):
         settings = get_repo_settings()
         return settings.local_assets_dir / self.Config.json_file_name
 
-    def _validate(self, asset: BaseModel, validators: set[callable]):
-        """Validate asset"""
-        for validator in validators:
-            validator(asset, self)
+    @property
+    def storage(self) -> Storage:
+        """Get the storage of the repository in the configured storage mode"""
+        return get_storage(type(self))
 
-    def _read_json_data(self):
-        with open(self.local_json_file, "r", encoding="utf-8") as infile:
-            return json.load(infile)
+    def _validate(self, asset: BaseModel, validators: set[callable], session: Optional[RepositorySession] = None):
+        """Validate asset, sharing one session between the validators to load other repositories"""
+        session = session or RepositorySession()
+        session.register(self)
+        with timed("validate"):
+            for validator in validators:
+                validator(asset, self, session)
 
-    def _write_json_data(self):
-        self.local_json_file.touch(exist_ok=True)
-        with open(self.local_json_file, "w", encoding="utf-8") as outfile:
-            outfile.write(self.json(indent=4))
+    def _apply(self, operation: Operation, asset: BaseModel) -> BaseModel:
+        """Apply an operation to the assets without validating or persisting it, returning the added or removed asset"""
+        if operation is Operation.ADD:
+            self.assets.append(asset)
+            self._index_asset(asset)
+        else:
+            asset = self.assets.pop(self.assets.index(asset))
+            self._unindex_asset(asset)
+        self.version += 1
+        return asset
 
-    def _upload(self):
+    def _commit(self):
+        """
+        Persist the changes, by appending them to the journal, by writing only the changed rows to the SQLite database
+        or by saving the whole repository
+        """
         settings = get_repo_settings()
-        s3_bucket = S3AssetBucket(bucket_name=settings.s3_bucket_name)
-        s3_bucket.upload_asset(self.Config.json_file_name)
+        if not settings.local_access or self._batch_depth or not self._changes:
+            return
+
+        retry_on_write_conflict(self._persist_changes, self._rebase)
+        self._after_save(self._take_changes())
+
+    def _persist(self):
+        """Write and upload the whole repository"""
+        self._upload(self.storage.write(self))
+
+    def _persist_changes(self):
+        """Write and upload only the changes, where the storage mode allows it"""
+        self._upload(self.storage.write_changes(self))
+
+    def _rebase(self):
+        """
+        Load the repository again after another writer changed it, and apply the changes that were not persisted yet
+        on top of it, validating them again
+        """
+        # pylint: disable=protected-access
+        storage = self.storage
+        changes = list(zip(self._changes, self._change_checks))
+        changed_shard_keys = storage.get_shard_keys(asset for (_, asset), _ in changes)
+
+        # The local files may hold the changes that were not uploaded, so they are downloaded again
+        self._s3_bucket.forget_asset_etags(storage.get_file_names(changed_shard_keys))
+        self.clear_cache()
+        if self._shard_keys is None:
+            stored = self.load()
+        else:
+            stored = self._load_shards(sorted(self._shard_keys | changed_shard_keys))
 
-    def _download(self):
+        self.assets = stored.assets
+        self.version = stored.version
+        self._journal_length = stored._journal_length
+        self._row_ids = stored._row_ids
+        self._shard_keys = stored._shard_keys
+        self._etags = stored._etags
+        self._changes, self._change_checks = [], []
+        for (operation, asset), check in changes:
+            if check.prepare:
+                check.prepare()
+            self._validate(asset, check.validators)
+            self._changes.append((operation, self._apply(operation, asset)))
+            self._change_checks.append(check)
+
+    def _take_changes(self) -> list[tuple[Operation, BaseModel]]:
+        """Take the changes that were just persisted"""
+        changes, self._changes, self._change_checks = self._changes, [], []
+        return changes
+
+    def _build_indexes(self):
+        """Rebuild the lookup indexes of the repository from its assets"""
+
+    def _copy_indexes(self, source: "JsonRepository"):  # pylint: disable=unused-argument
+        """
+        Copy the lookup indexes of a repository with the same assets, without sharing the containers that change when
+        assets are added or removed. Copying is much faster than rebuilding the indexes of a large repository.
+        """
+        self._build_indexes()
+
+    def _index_asset(self, asset: BaseModel):
+        """Add an asset to the lookup indexes of the repository"""
+
+    def _unindex_asset(self, asset: BaseModel):
+        """Remove an asset from the lookup indexes of the repository"""
+
+    def _after_save(self, changes: list[tuple[Operation, BaseModel]]):
+        """Process the changes that were just saved"""
+
+    def _clone(self):
+        """
+        Copy the repository, without sharing the list of assets, the indexes or the changes. The assets themselves are
+        shared, since they are not changed once they are in a repository.
+        """
+        # pylint: disable=protected-access
+        clone = self.copy(update={"assets": list(self.assets)})
+        clone._changes, clone._change_checks = [], []
+        clone._etags = dict(self._etags)
+        clone._row_ids = dict(self._row_ids)
+        clone._copy_indexes(self)
+        return clone
+
+    def _update_cache(self, fingerprint: tuple):
         settings = get_repo_settings()
-        s3_bucket = S3AssetBucket(bucket_name=settings.s3_bucket_name)
-        s3_bucket.download_asset(self.Config.json_file_name)
+        if settings.repository_cache:
+            _REPOSITORY_CACHE[type(self)] = _CacheEntry(fingerprint, self._clone())
+
+    @classmethod
+    def _load_shards(cls, shard_keys: list[str]):
+        # pylint: disable=protected-access
+        repo = cls()
+        repo._download(shard_keys=shard_keys)
+        etags = repo._get_known_etags(shard_keys)
+        repo = repo.storage.read(shard_keys)
+        repo._etags = etags
+        return repo
+
+    @property
+    def _s3_bucket(self) -> S3AssetBucket:
+        return S3AssetBucket(bucket_name=get_repo_settings().s3_bucket_name)
+
+    def _upload(self, bodies: FileBodies):
+        """Upload the written files, and only once they are uploaded cache the repository, when all of it is loaded"""
+        storage = self.storage
+        fingerprint = storage.fingerprint()
+        storage.upload(self, bodies)
+        if self._shard_keys is None:
+            self._update_cache(fingerprint)
+
+    def _upload_file(self, s3_bucket: S3AssetBucket, file_name: str, body: Optional[bytes] = None):
+        """Upload a file, on the condition that it did not change since it was loaded, when it was loaded"""
+        s3_bucket.upload_asset(file_name, file_name in self._etags, self._etags.get(file_name), body)
+        self._etags.update(s3_bucket.get_known_etags([file_name]))
+
+    def _download(self, shard_keys: Optional[list[str]] = None):
+        self.storage.download(self._s3_bucket, shard_keys)
+
+    def _get_known_etags(self, shard_keys: Optional[list[str]] = None) -> dict[str, Optional[str]]:
+        """Get the ETags of the stored files the local files were just synced with"""
+        return self._s3_bucket.get_known_etags(self.storage.get_file_names(shard_keys))
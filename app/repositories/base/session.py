@@ -0,0 +1,35 @@
+"""Unit of work for repositories."""
+from typing import TYPE_CHECKING, Type, TypeVar
+
+if TYPE_CHECKING:
+    from app.repositories.base.repo import JsonRepository
+
+RepoT = TypeVar("RepoT", bound="JsonRepository")
+
+
+class RepositorySession:
+    """Hands out every repository at most once, so it is only loaded once per request"""
+
+    def __init__(self):
+        self._repositories: dict[type, "JsonRepository"] = {}
+
+    def get(self, repo_class: Type[RepoT]) -> RepoT:
+        """Get a repository, loading it on first use"""
+        if (repo := self._repositories.get(repo_class)) is None:
+            repo = self._repositories[repo_class] = repo_class.load()
+        return repo
+
+    async def get_async(self, repo_class: Type[RepoT]) -> RepoT:
+        """Get a repository, loading it on first use without blocking the event loop"""
+        if (repo := self._repositories.get(repo_class)) is None:
+            repo = self._repositories[repo_class] = await repo_class.load_async()
+        return repo
+
+    def register(self, repo: "JsonRepository"):
+        """Make the session hand out an already loaded repository"""
+        self._repositories.setdefault(type(repo), repo)
+
+
+def get_repository_session() -> RepositorySession:
+    """Create a repository session for a request"""
+    return RepositorySession()
@@ -0,0 +1,161 @@
+"""Storage of the assets of repositories in one json file per shard"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Iterable, Optional
+
+from pydantic import BaseModel
+
+from app.metrics import timed
+from app.s3 import S3AssetBucket
+from app.settings.repository import get_repo_settings
+from app.utils import write_file_atomically
+
+
+class JsonShards:
+    """
+    Json files in a directory, each holding the assets of one shard.
+
+    An index file holds the version of the repository and a hash of every shard, so readers only download the shards
+    that changed. Writers replace the index last, so it never refers to shards that are not written yet.
+    """
+
+    index_name = "index"
+
+    def __init__(self, assets_dir: Path, name: str):
+        self.assets_dir = assets_dir
+        self.name = name
+
+    @property
+    def index_file_name(self) -> str:
+        """Get the name of the index file, relative to the assets directory"""
+        return self.shard_file_name(self.index_name)
+
+    @property
+    def local_index_file(self) -> Path:
+        """Get the local path of the index file"""
+        return self.assets_dir / self.index_file_name
+
+    def shard_file_name(self, shard_key: str) -> str:
+        """Get the name of the file of a shard, relative to the assets directory"""
+        return f"{self.name}/{shard_key}.json"
+
+    def shard_key(self, shard_file_name: str) -> str:
+        """Get the key of the shard of a file, the inverse of shard_file_name"""
+        return shard_file_name.removeprefix(f"{self.name}/").removesuffix(".json")
+
+    def read_index(self) -> dict:
+        """Read the local index, which is empty when nothing is stored yet"""
+        if not self.local_index_file.exists():
+            return {"version": 0, "shards": {}}
+        return json.loads(self.local_index_file.read_text(encoding="utf-8"))
+
+    @timed("json_read")
+    def read(self, shard_keys: Optional[Iterable[str]] = None) -> tuple[int, list[dict]]:
+        """Read the version and the assets of all shards, or of the given shards, ordered by shard key"""
+        index = self.read_index()
+        shard_keys = index["shards"] if shard_keys is None else set(shard_keys) & index["shards"].keys()
+
+        assets = []
+        for shard_key in sorted(shard_keys):
+            with open(self.assets_dir / self.shard_file_name(shard_key), "r", encoding="utf-8") as infile:
+                assets += json.load(infile)["assets"]
+        return index["version"], assets
+
+    @timed("json_write")
+    def write(self, assets_by_shard: dict[str, list[BaseModel]], version: int) -> dict[str, Optional[bytes]]:
+        """
+        Write the given shards and the index, removing the shards without assets.
+
+        Returns the content of the shard files that changed, None for the shard files that were removed, and the
+        content of the index last, by file name.
+        """
+        index = self.read_index()
+        changed_files = {}
+        for shard_key, assets in sorted(assets_by_shard.items()):
+            local_file = self.assets_dir / self.shard_file_name(shard_key)
+            if not assets:
+                local_file.unlink(missing_ok=True)
+                if index["shards"].pop(shard_key, None) is not None:
+                    changed_files[self.shard_file_name(shard_key)] = None
+                continue
+
+            content = ('{"assets": [' + ", ".join(asset.json() for asset in assets) + "]}").encode()
+            content_hash = hashlib.sha256(content).hexdigest()
+            if index["shards"].get(shard_key) != content_hash or not local_file.exists():
+                write_file_atomically(local_file, content)
+                index["shards"][shard_key] = content_hash
+                changed_files[self.shard_file_name(shard_key)] = content
+
+        index["version"] = version
+        changed_files[self.index_file_name] = self._write_index(index)
+        _SYNCED_INDEXES[self.local_index_file] = _get_stat(self.local_index_file)
+        return changed_files
+
+    def update_index(self, shard_hashes: dict[str, Optional[str]], version: int) -> bytes:
+        """
+        Set the hashes of the given shards in the local index, removing the shards without a hash, and keep the hashes
+        of the other shards. The version only increases. Returns the content of the index.
+        """
+        index = self.read_index()
+        for shard_key, content_hash in shard_hashes.items():
+            if content_hash is None:
+                index["shards"].pop(shard_key, None)
+            else:
+                index["shards"][shard_key] = content_hash
+        index["version"] = max(index["version"], version)
+        return self._write_index(index)
+
+    def download(self, s3_bucket: S3AssetBucket, shard_keys: Optional[Iterable[str]] = None):
+        """
+        Download the index, and the shards that differ from their local copy or of which the stored version is not
+        known yet
+        """
+        self.local_index_file.parent.mkdir(parents=True, exist_ok=True)
+        s3_bucket.download_asset(self.index_file_name, missing_ok=True)
+
+        index_stat = _get_stat(self.local_index_file)
+        if shard_keys is None and _SYNCED_INDEXES.get(self.local_index_file) == index_stat:
+            return
+
+        shard_hashes = self.read_index()["shards"]
+        stored_keys = shard_hashes if shard_keys is None else set(shard_keys) & shard_hashes.keys()
+        known_etags = s3_bucket.get_known_etags(map(self.shard_file_name, stored_keys))
+        for shard_key in stored_keys:
+            file_name = self.shard_file_name(shard_key)
+            etag_unknown = file_name not in known_etags and get_repo_settings().s3_access
+            if etag_unknown or _get_local_hash(self.assets_dir / file_name) != shard_hashes[shard_key]:
+                s3_bucket.download_asset(file_name)
+
+        if shard_keys is None:
+            _SYNCED_INDEXES[self.local_index_file] = index_stat
+
+    def _write_index(self, index: dict) -> bytes:
+        content = json.dumps(index, indent=4, sort_keys=True).encode()
+        write_file_atomically(self.local_index_file, content)
+        return content
+
+
+# Modification time and size of the local index files that all local shards were last synced with
+_SYNCED_INDEXES: dict[Path, Optional[tuple[int, int]]] = {}
+# Hash of the local shard files by path, along with the modification time and size they were hashed at
+_LOCAL_HASHES: dict[Path, tuple[tuple[int, int], str]] = {}
+
+
+def _get_stat(local_file: Path) -> Optional[tuple[int, int]]:
+    if not local_file.exists():
+        return None
+    stat = local_file.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _get_local_hash(local_file: Path) -> Optional[str]:
+    """Hash a local file, only reading it when it was modified since it was last hashed"""
+    if (stat := _get_stat(local_file)) is None:
+        return None
+    cached = _LOCAL_HASHES.get(local_file)
+    if cached and cached[0] == stat:
+        return cached[1]
+    content_hash = hashlib.sha256(local_file.read_bytes()).hexdigest()
+    _LOCAL_HASHES[local_file] = (stat, content_hash)
+    return content_hash
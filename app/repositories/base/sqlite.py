@@ -0,0 +1,99 @@
+"""Storage of the assets of repositories in a SQLite database"""
+import sqlite3
+import uuid
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+from pydantic import BaseModel
+
+from app.metrics import timed
+
+_CREATE_VERSIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS repository_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        revision TEXT NOT NULL
+    )
+"""
+
+
+class StoredVersion(NamedTuple):
+    """The version of the assets of a repository, and a unique identifier of the write that stored them"""
+
+    version: int
+    revision: str
+
+
+class SqliteTable:
+    """
+    Table of the assets of one repository, with every asset stored as json in a row of its own.
+
+    The repositories always read all rows and look assets up in memory, so the table has no columns to query on.
+    """
+
+    def __init__(self, database_file: Path, name: str):
+        self.database_file = database_file
+        self.name = name
+
+    def get_version(self) -> Optional[StoredVersion]:
+        """Return the stored version of the table, or None when nothing is stored yet"""
+        if not self.database_file.exists():
+            return None
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT version, revision FROM repository_versions WHERE name = ?", (self.name,)
+            ).fetchone()
+        return StoredVersion(*row) if row else None
+
+    @timed("sqlite_read")
+    def read(self) -> tuple[Optional[StoredVersion], list[tuple[int, str]]]:
+        """Read the stored version, and the row id and json of every asset in the order they were added"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT version, revision FROM repository_versions WHERE name = ?", (self.name,)
+            ).fetchone()
+            assets = connection.execute(f'SELECT id, data FROM "{self.name}" ORDER BY id').fetchall()
+        return (StoredVersion(*row) if row else None), assets
+
+    @timed("sqlite_write")
+    def replace(self, assets: list[BaseModel], version: int) -> list[int]:
+        """Replace all stored assets, returning the row ids of the assets"""
+        with self._connect() as connection:
+            connection.execute(f'DELETE FROM "{self.name}"')
+            row_ids = self._insert(connection, assets)
+            self._set_version(connection, version)
+        return row_ids
+
+    @timed("sqlite_write")
+    def write_changes(self, added: list[BaseModel], removed_row_ids: list[int], version: int) -> list[int]:
+        """Delete the rows of the removed assets and insert the added ones, returning the row ids of the added ones"""
+        with self._connect() as connection:
+            connection.executemany(f'DELETE FROM "{self.name}" WHERE id = ?', [(row_id,) for row_id in removed_row_ids])
+            row_ids = self._insert(connection, added)
+            self._set_version(connection, version)
+        return row_ids
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connect to the database, committing the transaction on success and rolling it back on error"""
+        with closing(sqlite3.connect(self.database_file)) as connection:
+            with connection:
+                self._create(connection)
+                yield connection
+
+    def _create(self, connection: sqlite3.Connection):
+        connection.execute(_CREATE_VERSIONS_TABLE)
+        connection.execute(f'CREATE TABLE IF NOT EXISTS "{self.name}" (id INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+
+    def _insert(self, connection: sqlite3.Connection, assets: list[BaseModel]) -> list[int]:
+        statement = f'INSERT INTO "{self.name}" (data) VALUES (?)'
+        return [connection.execute(statement, (asset.json(),)).lastrowid for asset in assets]
+
+    def _set_version(self, connection: sqlite3.Connection, version: int) -> StoredVersion:
+        stored_version = StoredVersion(version, uuid.uuid4().hex)
+        connection.execute(
+            "INSERT OR REPLACE INTO repository_versions (name, version, revision) VALUES (?, ?, ?)",
+            (self.name, *stored_version),
+        )
+        return stored_version
@@ -0,0 +1,463 @@
+"""Storage of the assets of repositories, in the configured storage mode"""
+import hashlib
+import json
+import logging
+import re
+from abc import ABC, abstractmethod
+from enum import Enum
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, TypeVar
+
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+
+from app.exceptions import WriteConflictError
+from app.metrics import timed
+from app.repositories.base.hydration import construct_trusted
+from app.repositories.base.shards import JsonShards
+from app.repositories.base.sqlite import SqliteTable
+from app.s3 import S3AssetBucket
+from app.settings.repository import StorageMode, get_repo_settings
+from app.utils import write_file_atomically
+
+if TYPE_CHECKING:
+    from app.repositories.base.repo import JsonRepository
+
+# The storages read and write the state the repositories keep about their stored files
+# pylint: disable=protected-access
+
+# Process-wide cache of the fingerprint and content hash of the stored repositories, keyed by repository class
+_CONTENT_HASH_CACHE: dict[type, tuple[tuple, str]] = {}
+
+# Start of the json files written with a checksum of the rest of their content
+_CHECKSUM_PATTERN = re.compile(r'\{\n    "checksum": "(?P<checksum>[0-9a-f]{64})",')
+
+ResultT = TypeVar("ResultT")
+
+# Content of written files by file name, or None for the files that were removed
+FileBodies = dict[str, Optional[bytes]]
+
+
+class Operation(str, Enum):
+    """A change made to the assets of a repository"""
+
+    ADD = "add"
+    REMOVE = "remove"
+
+
+def retry_on_write_conflict(write: Callable[[], ResultT], prepare_retry: Callable[[], object]) -> ResultT:
+    """Write, preparing another attempt after every write conflict, up to the configured number of retries"""
+    retries = get_repo_settings().write_conflict_retries
+    while True:
+        try:
+            return write()
+        except WriteConflictError:
+            if not retries:
+                raise
+            retries -= 1
+            logging.info("Retrying a write that conflicted with another writer")
+            prepare_retry()
+
+
+class Storage(ABC):
+    """
+    How the assets of a repository class are stored in local files, and which of those files are synced with S3.
+
+    A storage keeps no state of its own, so one is created with the current settings whenever a repository needs it.
+    Only the sharded storage stores the assets in shards, which can be loaded and written on their own.
+    """
+
+    sharded = False
+
+    def __init__(self, repo_class: type["JsonRepository"]):
+        self.repo_class = repo_class
+
+    @property
+    def name(self) -> str:
+        """Get the name of the repository in the storage"""
+        return Path(self.repo_class.Config.json_file_name).stem
+
+    def get_shard_keys(self, assets: Iterable[BaseModel]) -> set[str]:  # pylint: disable=unused-argument
+        """Get the keys of the shards the assets are stored in, which is none when the storage is not sharded"""
+        return set()
+
+    @abstractmethod
+    def get_file_names(self, shard_keys: Optional[Iterable[str]] = None) -> list[str]:
+        """Get the names of the files the assets are stored in, with only the given shards when given"""
+
+    def download(self, s3_bucket: S3AssetBucket, shard_keys: Optional[Iterable[str]] = None):
+        """Download the files the assets are stored in, with only the given shards, unless they are up-to-date"""
+        for file_name in self.get_file_names(shard_keys):
+            s3_bucket.download_asset(file_name, missing_ok=True)
+
+    @abstractmethod
+    def fingerprint(self) -> tuple:
+        """Identify the current version of the local files, which is empty when nothing is stored yet"""
+
+    def content_hash(self, shard_key: Optional[str] = None) -> Optional[str]:  # pylint: disable=unused-argument
+        """Return a hash of the stored assets, or of only the given shard, or None when nothing is stored yet"""
+        fingerprint = self.fingerprint()
+        return fingerprint[-1] if fingerprint else None
+
+    @abstractmethod
+    def read(self, shard_keys: Optional[Iterable[str]] = None) -> "JsonRepository":
+        """Build the repository from the local files, with only the given shards"""
+
+    @abstractmethod
+    def write(self, repo: "JsonRepository") -> FileBodies:
+        """Write all assets of the repository, returning the content of the files to upload"""
+
+    def write_changes(self, repo: "JsonRepository") -> FileBodies:
+        """Write only the changes of the repository where the storage allows it, returning the files to upload"""
+        return self.write(repo)
+
+    def upload(self, repo: "JsonRepository", bodies: FileBodies):
+        """
+        Upload the content that was written, rather than the local files which another writer may have replaced since,
+        on the condition that the files did not change since the repository was loaded
+        """
+        s3_bucket = repo._s3_bucket
+        for file_name, body in bodies.items():
+            repo._upload_file(s3_bucket, file_name, body)
+
+    @staticmethod
+    def _read_bodies(file_names: Iterable[str]) -> FileBodies:
+        """Read the content of local files right after they were written"""
+        assets_dir = get_repo_settings().local_assets_dir
+        return {file_name: (assets_dir / file_name).read_bytes() for file_name in file_names}
+
+
+class SnapshotStorage(Storage):
+    """
+    One json file per repository, rewritten on every change.
+
+    A journal left behind by the journal storage mode is applied on load and compacted into the json file on write, so
+    the storage mode can be switched without losing changes.
+    """
+
+    @property
+    def json_file_name(self) -> str:
+        """Get the name of the json file"""
+        return self.repo_class.Config.json_file_name
+
+    @property
+    def journal_file_name(self) -> str:
+        """Get the name of the journal file, which holds the operations since the json file was last saved"""
+        return f"{self.name}.journal.jsonl"
+
+    @property
+    def local_json_file(self) -> Path:
+        """Get local json file path"""
+        return get_repo_settings().local_assets_dir / self.json_file_name
+
+    @property
+    def local_journal_file(self) -> Path:
+        """Get local journal file path"""
+        return get_repo_settings().local_assets_dir / self.journal_file_name
+
+    def get_file_names(self, shard_keys: Optional[Iterable[str]] = None) -> list[str]:
+        return [self.json_file_name, self.journal_file_name]
+
+    def download(self, s3_bucket: S3AssetBucket, shard_keys: Optional[Iterable[str]] = None):
+        s3_bucket.download_asset(self.json_file_name, missing_ok=True)
+
+    def fingerprint(self) -> tuple:
+        fingerprint = ()
+        for path in (self.local_json_file, self.local_journal_file):
+            if path.exists():
+                stat = path.stat()
+                fingerprint += (str(path), stat.st_mtime_ns, stat.st_size)
+        return fingerprint
+
+    def content_hash(self, shard_key: Optional[str] = None) -> Optional[str]:
+        """Hash the local json and journal files, only reading them when their fingerprint changed"""
+        if not (fingerprint := self.fingerprint()):
+            return None
+
+        cached = _CONTENT_HASH_CACHE.get(self.repo_class)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        content_hash = hashlib.sha256()
+        for path in (self.local_json_file, self.local_journal_file):
+            if path.exists():
+                content_hash.update(path.read_bytes())
+        _CONTENT_HASH_CACHE[self.repo_class] = (fingerprint, content_hash.hexdigest())
+        return content_hash.hexdigest()
+
+    def read(self, shard_keys: Optional[Iterable[str]] = None) -> "JsonRepository":
+        settings = get_repo_settings()
+        json_data, checksum_valid = self._read_json_data() if self.local_json_file.exists() else ({}, False)
+        with timed("model_parse"):
+            repo = self._from_json_data(json_data, trusted=checksum_valid and settings.trusted_load)
+        if self.local_journal_file.exists():
+            self._replay_journal(repo)
+        return repo
+
+    def write(self, repo: "JsonRepository") -> FileBodies:
+        bodies = {self.json_file_name: self._write_json_data(repo)}
+        if self.local_journal_file.exists():
+            self._truncate_journal(repo)
+            bodies[self.journal_file_name] = b""
+        return bodies
+
+    @timed("json_read")
+    def _read_json_data(self) -> tuple[dict, bool]:
+        """Read the json file, and check if its content matches the checksum it was written with"""
+        with open(self.local_json_file, "r", encoding="utf-8") as infile:
+            content = infile.read()
+
+        checksum_valid = False
+        if match := _CHECKSUM_PATTERN.match(content):
+            checksum = hashlib.sha256(("{" + content[match.end() :]).encode()).hexdigest()
+            checksum_valid = checksum == match["checksum"]
+        return json.loads(content), checksum_valid
+
+    def _from_json_data(self, json_data: dict, trusted: bool = False) -> "JsonRepository":
+        """Build the repository from json data, without validating it again when it can be trusted"""
+        if trusted:
+            try:
+                repo = construct_trusted(self.repo_class, json_data)
+            except ValueError as error:
+                logging.warning(
+                    "Validating %s, since it could not be built without validation: %s", self.repo_class.__name__, error
+                )
+            else:
+                repo._build_indexes()
+                return repo
+        return self.repo_class(**json_data)
+
+    @timed("json_write")
+    def _write_json_data(self, repo: "JsonRepository") -> bytes:
+        content = repo.json(indent=4)
+        checksum = hashlib.sha256(content.encode()).hexdigest()
+        body = f'{{\n    "checksum": "{checksum}",{content[1:]}'.encode()
+        write_file_atomically(self.local_json_file, body)
+        return body
+
+    def _read_journal(self) -> list[dict]:
+        operations = []
+        with open(self.local_journal_file, "r", encoding="utf-8") as infile:
+            for line in infile:
+                try:
+                    operations.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # An incomplete last line, left behind by an interrupted write
+                    break
+        return operations
+
+    @timed("journal_replay")
+    def _replay_journal(self, repo: "JsonRepository"):
+        """Apply the operations in the journal that are not in the json file yet"""
+        asset_class = self.repo_class.__fields__["assets"].type_
+        operations = self._read_journal()
+        for operation in operations:
+            if operation["version"] > repo.version:
+                repo._apply(Operation(operation["operation"]), asset_class.parse_obj(operation["asset"]))
+        repo._journal_length = len(operations)
+
+    def _truncate_journal(self, repo: "JsonRepository"):
+        self.local_journal_file.write_text("", encoding="utf-8")
+        repo._journal_length = 0
+
+
+class JournalStorage(SnapshotStorage):
+    """Changes are appended to a journal, which is compacted into the json file every configured number of changes"""
+
+    def download(self, s3_bucket: S3AssetBucket, shard_keys: Optional[Iterable[str]] = None):
+        super().download(s3_bucket)
+        s3_bucket.download_asset(self.journal_file_name, missing_ok=True)
+
+    def write_changes(self, repo: "JsonRepository") -> FileBodies:
+        settings = get_repo_settings()
+        if repo._journal_length + len(repo._changes) > settings.journal_compaction_threshold:
+            return self.write(repo)
+        self._append_to_journal(repo)
+        return self._read_bodies([self.journal_file_name])
+
+    @timed("journal_write")
+    def _append_to_journal(self, repo: "JsonRepository"):
+        first_version = repo.version - len(repo._changes) + 1
+        with open(self.local_journal_file, "a", encoding="utf-8") as outfile:
+            for version, (operation, asset) in enumerate(repo._changes, start=first_version):
+                line = {"version": version, "operation": operation.value, "asset": asset}
+                outfile.write(json.dumps(line, default=pydantic_encoder) + "\n")
+        repo._journal_length += len(repo._changes)
+
+
+class SqliteStorage(Storage):
+    """
+    One row per asset in a SQLite database, so a change only writes the rows it touches.
+
+    The repository keeps the row id of every asset, so the rows of removed assets are deleted by their id.
+    """
+
+    @property
+    def table(self) -> SqliteTable:
+        """Get the table of the repository in the local SQLite database"""
+        settings = get_repo_settings()
+        return SqliteTable(settings.local_assets_dir / settings.sqlite_file_name, self.name)
+
+    def get_file_names(self, shard_keys: Optional[Iterable[str]] = None) -> list[str]:
+        return [get_repo_settings().sqlite_file_name]
+
+    def fingerprint(self) -> tuple:
+        table = self.table
+        stored_version = table.get_version()
+        return (str(table.database_file), table.name, stored_version.revision) if stored_version else ()
+
+    def read(self, shard_keys: Optional[Iterable[str]] = None) -> "JsonRepository":
+        stored_version, rows = self.table.read()
+        asset_class = self.repo_class.__fields__["assets"].type_
+        with timed("model_parse"):
+            repo = self.repo_class(
+                assets=[asset_class.parse_raw(data) for _, data in rows], version=stored_version.version
+            )
+        repo._row_ids = {id(asset): row_id for asset, (row_id, _) in zip(repo.assets, rows)}
+        return repo
+
+    def write(self, repo: "JsonRepository") -> FileBodies:
+        row_ids = self.table.replace(repo.assets, repo.version)
+        repo._row_ids = dict(zip(map(id, repo.assets), row_ids))
+        return self._read_bodies(self.get_file_names())
+
+    def write_changes(self, repo: "JsonRepository") -> FileBodies:
+        # An asset that is added and removed again within the changes never gets a row
+        added, removed_row_ids = {}, []
+        for operation, asset in repo._changes:
+            if operation is Operation.ADD:
+                added[id(asset)] = asset
+            elif added.pop(id(asset), None) is None:
+                removed_row_ids.append(repo._row_ids.pop(id(asset)))
+
+        row_ids = self.table.write_changes(list(added.values()), removed_row_ids, repo.version)
+        repo._row_ids.update(zip(added, row_ids))
+        return self._read_bodies(self.get_file_names())
+
+
+class ShardedStorage(Storage):
+    """
+    One json file per value of the shard attribute of the assets, with an index of their hashes, so a change only
+    writes and uploads the shards it touches and reads only download the shards that changed
+    """
+
+    sharded = True
+
+    @property
+    def shards(self) -> JsonShards:
+        """Get the json files of the shards of the repository"""
+        return JsonShards(get_repo_settings().local_assets_dir, self.name)
+
+    def get_shard_keys(self, assets: Iterable[BaseModel]) -> set[str]:
+        return set(map(self._shard_key, assets))
+
+    def get_file_names(self, shard_keys: Optional[Iterable[str]] = None) -> list[str]:
+        shards = self.shards
+        if shard_keys is None:
+            shard_keys = shards.read_index()["shards"]
+        return [shards.index_file_name] + [shards.shard_file_name(shard_key) for shard_key in shard_keys]
+
+    def download(self, s3_bucket: S3AssetBucket, shard_keys: Optional[Iterable[str]] = None):
+        self.shards.download(s3_bucket, shard_keys)
+
+    def fingerprint(self) -> tuple:
+        # The index is small and downloaded again after every upload, so it is identified by its content
+        index_file = self.shards.local_index_file
+        return (str(index_file), hashlib.sha256(index_file.read_bytes()).hexdigest()) if index_file.exists() else ()
+
+    def content_hash(self, shard_key: Optional[str] = None) -> Optional[str]:
+        if shard_key is None:
+            return super().content_hash()
+        return self.shards.read_index()["shards"].get(shard_key)
+
+    def read(self, shard_keys: Optional[Iterable[str]] = None) -> "JsonRepository":
+        version, assets = self.shards.read(shard_keys)
+        asset_class = self.repo_class.__fields__["assets"].type_
+        with timed("model_parse"):
+            repo = self.repo_class(assets=[asset_class.parse_obj(asset) for asset in assets], version=version)
+        if shard_keys is not None:
+            repo._shard_keys = set(shard_keys)
+        return repo
+
+    def write(self, repo: "JsonRepository") -> FileBodies:
+        """Write the loaded shards, or all shards when all of them were loaded"""
+        shard_keys = repo._shard_keys
+        if shard_keys is None:
+            shard_keys = set(self.shards.read_index()["shards"])
+        return self._write_shards(repo, shard_keys | self.get_shard_keys(repo.assets))
+
+    def write_changes(self, repo: "JsonRepository") -> FileBodies:
+        return self._write_shards(repo, self.get_shard_keys(asset for _, asset in repo._changes))
+
+    def upload(self, repo: "JsonRepository", bodies: FileBodies):
+        """
+        Upload the changed shards on the condition that nobody else changed them, and then the index. When only the
+        index conflicts, it is merged with the index of the other writer.
+        """
+        shards = self.shards
+        s3_bucket = repo._s3_bucket
+        *shard_file_names, index_file_name = bodies
+        for file_name in shard_file_names:
+            if bodies[file_name] is None:
+                # A removed shard is only left out of the index
+                continue
+            if repo._etags and file_name not in repo._etags:
+                # A shard that was not in the index when the repository was loaded may still be stored, since removed
+                # shards are only left out of the index, so it is replaced on the condition of its stored version
+                repo._etags[file_name] = s3_bucket.get_stored_etag(file_name)
+            repo._upload_file(s3_bucket, file_name, bodies[file_name])
+
+        index = json.loads(bodies[index_file_name])["shards"]
+        shard_hashes = {shard_key: index.get(shard_key) for shard_key in map(shards.shard_key, shard_file_names)}
+        retry_on_write_conflict(
+            lambda: repo._upload_file(s3_bucket, index_file_name, bodies[index_file_name]),
+            partial(self._merge_index, repo, s3_bucket, bodies, shard_hashes),
+        )
+
+    def _write_shards(self, repo: "JsonRepository", shard_keys: set[str]) -> FileBodies:
+        assets_by_shard = {shard_key: [] for shard_key in shard_keys}
+        for asset in repo.assets:
+            if (shard_key := self._shard_key(asset)) in assets_by_shard:
+                assets_by_shard[shard_key].append(asset)
+        return self.shards.write(assets_by_shard, repo.version)
+
+    def _shard_key(self, asset: BaseModel) -> str:
+        return str(getattr(asset, self.repo_class.__config__.shard_attribute))
+
+    def _merge_index(
+        self,
+        repo: "JsonRepository",
+        s3_bucket: S3AssetBucket,
+        bodies: FileBodies,
+        shard_hashes: dict[str, Optional[str]],
+    ):
+        shards = self.shards
+        s3_bucket.download_asset(shards.index_file_name, missing_ok=True)
+        repo._etags.update(s3_bucket.get_known_etags([shards.index_file_name]))
+        bodies[shards.index_file_name] = shards.update_index(shard_hashes, repo.version)
+
+
+_STORAGE_CLASSES: dict[StorageMode, type[Storage]] = {
+    StorageMode.SNAPSHOT: SnapshotStorage,
+    StorageMode.JOURNAL: JournalStorage,
+    StorageMode.SQLITE: SqliteStorage,
+    StorageMode.SHARDED: ShardedStorage,
+}
+
+
+def get_storage(repo_class: type["JsonRepository"]) -> Storage:
+    """Get the storage of a repository class in the configured storage mode, which is snapshot in the sharded mode
+    for a repository class without a shard attribute"""
+    storage_mode = get_repo_settings().storage_mode
+    if storage_mode is StorageMode.SHARDED and not repo_class.__config__.shard_attribute:
+        storage_mode = StorageMode.SNAPSHOT
+    return _STORAGE_CLASSES[storage_mode](repo_class)
+
+
+def clear_content_hashes(repo_class: Optional[type["JsonRepository"]] = None):
+    """Forget the content hash of a repository class, or of all repository classes"""
+    if repo_class is None:
+        _CONTENT_HASH_CACHE.clear()
+    else:
+        _CONTENT_HASH_CACHE.pop(repo_class, None)
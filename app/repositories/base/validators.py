@@ -9,13 +9,13 @@ if TYPE_CHECKING:
     from app.repositories.base.repo import JsonRepository
 
 
-def assert_in(asset: BaseModel, repo: "JsonRepository"):
+def assert_in(asset: BaseModel, repo: "JsonRepository", *_args):
     """Assert that an asset is in the repository."""
-    if asset not in repo.assets:
+    if asset not in repo:
         raise NotFoundError(f"{asset} does not exist")
 
 
-def assert_not_in(asset: BaseModel, repo: "JsonRepository"):
+def assert_not_in(asset: BaseModel, repo: "JsonRepository", *_args):
     """Assert that an asset is not in the repository."""
-    if asset in repo.assets:
+    if asset in repo:
         raise AlreadyExistsError(f"{asset} already exists")
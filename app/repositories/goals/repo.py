@@ -1,9 +1,23 @@
+import logging
+from bisect import insort
 from collections import Counter
 from datetime import date
+from typing import Optional
+
+from pydantic import PrivateAttr
 
 from app.models.goals import CountType, Goal, Score
 from app.models.matches import Match
-from app.repositories.base.repo import JsonRepository
+from app.models.player_counts import PlayerCount
+from app.models.players import Player
+from app.models.timelines import MatchResult, MatchTimeline
+from app.repositories.base.repo import (
+    JsonRepository,
+    Operation,
+    retry_on_write_conflict,
+)
+from app.repositories.player_counts import PlayerCountRepository
+from app.utils import iter_between_reversed, paginate
 
 
 class GoalRepository(JsonRepository):
@@ -11,18 +25,23 @@ class GoalRepository(JsonRepository):
 
     assets: list[Goal] = []
 
+    # Goals of each match, ordered by score
+    _goals_by_match_date: dict[date, list[Goal]] = PrivateAttr(default_factory=dict)
+    # Sorted dates of the matches with goals
+    _match_dates: list[date] = PrivateAttr(default_factory=list)
+    # One shared instance of every player involved in the goals, by name as it is spelled, so interning never changes
+    # the spelling a goal is stored with
+    _players_by_name: dict[str, Player] = PrivateAttr(default_factory=dict)
+
     class Config:
         """Pydantic configuration"""
 
         json_file_name = "goals.json"
+        shard_attribute = "match_date"
 
     def get_next_score(self, goal: Goal, match: Match) -> Score:
         """Return the score after the goal is scored"""
-        match_goals = self.get_by_match_date(goal.match_date)
-        if match_goals:
-            previous_score = max(match_goals).score
-        else:
-            previous_score = Score.construct(home=0, away=0)
+        previous_score = self.get_current_score(goal.match_date)
 
         home_match_team_goal = match.is_home and goal.is_team_goal
         home_match_opponent_goal = match.is_home and goal.is_opponent_goal
@@ -39,8 +58,62 @@ class GoalRepository(JsonRepository):
         return next_score
 
     def get_by_match_date(self, match_date: date) -> list[Goal]:
-        """Return a list of goals scored in a match"""
-        return [goal for goal in self.assets if goal.match_date == match_date]
+        """Return a list of goals scored in a match, ordered by score"""
+        return list(self._goals_by_match_date.get(match_date, []))
+
+    def get_page(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> list[Goal]:
+        """Return a page of the goals scored between start and end (inclusive), newest first"""
+        goals = (
+            goal
+            for match_date in iter_between_reversed(self._match_dates, start, end)
+            for goal in reversed(self._goals_by_match_date[match_date])
+        )
+        return paginate(goals, offset, limit)
+
+    def get_last_goal(self, match_date: date) -> Optional[Goal]:
+        """Return the last goal scored in a match, if any"""
+        if match_goals := self._goals_by_match_date.get(match_date):
+            return match_goals[-1]
+        return None
+
+    def get_current_score(self, match_date: date) -> Score:
+        """Return the score of a match after its last goal"""
+        if last_goal := self.get_last_goal(match_date):
+            return last_goal.score
+        return Score.construct(home=0, away=0)
+
+    def get_timeline(self, match: Match) -> MatchTimeline:
+        """
+        Return the goals of a match in the order they were scored, with the players involved and the result.
+
+        The goals of each match are kept ordered by score as they are added and removed, so no goals are sorted here.
+        """
+        match_goals = self._goals_by_match_date.get(match.match_date, [])
+        player_counts: dict[str, PlayerCount] = {}
+        for goal in match_goals:
+            if isinstance(goal.scored_by, Player):
+                player_counts.setdefault(goal.scored_by.key, PlayerCount(player=goal.scored_by)).goals += 1
+            if isinstance(goal.assisted_by, Player):
+                player_counts.setdefault(goal.assisted_by.key, PlayerCount(player=goal.assisted_by)).assists += 1
+
+        score = self.get_current_score(match.match_date)
+        team_goals, opponent_goals = (score.home, score.away) if match.is_home else (score.away, score.home)
+        if team_goals > opponent_goals:
+            result = MatchResult.WIN
+        elif team_goals < opponent_goals:
+            result = MatchResult.LOSS
+        else:
+            result = MatchResult.DRAW
+
+        return MatchTimeline(
+            match=match, goals=match_goals, player_counts=list(player_counts.values()), score=score, result=result
+        )
 
     def get_player_counts(self, count_type: CountType) -> Counter:
         """Return a counter of the number of goals or assists scored by each player"""
@@ -52,5 +125,79 @@ class GoalRepository(JsonRepository):
             raise NotImplementedError(f"Invalid count_type {CountType}")
 
         counter = Counter([getattr(goal, attr) for goal in self.assets])
-        counter.pop(None)
+        counter.pop(None, None)
         return counter
+
+    def _after_save(self, changes: list[tuple[Operation, Goal]]):
+        """
+        Keep the player counts up-to-date with the saved goals.
+
+        The counts are stored with the version of the goals they count, and only the changes are applied to counts of
+        the version the changes were made to. Other counts are counted again from all goals: counts that missed changes,
+        for example because updating them failed, from this repository, and counts of a later or the same version from
+        the stored goals. Those counts were made by another writer that saved later goals, by a writer of which the
+        deferred upload of the goals conflicted, or before the goals were restored or migrated to an earlier version.
+
+        Since the goals are already saved, a failure to update the counts is only logged, and the next change of the
+        goals repairs them.
+        """
+        if not changes:
+            return
+
+        def _save_player_counts():
+            count_repo = PlayerCountRepository.load()
+            if count_repo.is_stored() and count_repo.version == self.version - len(changes):
+                count_repo.apply_changes(changes)
+                count_repo.version = self.version
+            else:
+                counts_behind = count_repo.version < self.version
+                goal_repo = self if counts_behind and self._shard_keys is None else GoalRepository.load()
+                count_repo = PlayerCountRepository.from_goals(goal_repo)
+                count_repo.version = goal_repo.version
+            count_repo.save()
+
+        try:
+            # The counts are loaded again when another writer changed them in the meantime
+            retry_on_write_conflict(_save_player_counts, PlayerCountRepository.clear_cache)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception(
+                "Updating the player counts failed, they are counted again on the next change of the goals"
+            )
+
+    def _build_indexes(self):
+        self._goals_by_match_date = {}
+        self._players_by_name = {}
+        for goal in self.assets:
+            self._intern_players(goal)
+            self._goals_by_match_date.setdefault(goal.match_date, []).append(goal)
+        for match_goals in self._goals_by_match_date.values():
+            match_goals.sort()
+        self._match_dates = sorted(self._goals_by_match_date)
+
+    def _copy_indexes(self, source: "GoalRepository"):
+        # pylint: disable=protected-access
+        self._goals_by_match_date = {
+            match_date: list(goals) for match_date, goals in source._goals_by_match_date.items()
+        }
+        self._match_dates = list(source._match_dates)
+        self._players_by_name = dict(source._players_by_name)
+
+    def _index_asset(self, asset: Goal):
+        self._intern_players(asset)
+        if asset.match_date not in self._goals_by_match_date:
+            insort(self._match_dates, asset.match_date)
+        insort(self._goals_by_match_date.setdefault(asset.match_date, []), asset)
+
+    def _unindex_asset(self, asset: Goal):
+        match_goals = self._goals_by_match_date[asset.match_date]
+        match_goals.remove(asset)
+        if not match_goals:
+            del self._goals_by_match_date[asset.match_date]
+            self._match_dates.remove(asset.match_date)
+
+    def _intern_players(self, goal: Goal):
+        """Make the goal refer to the shared instances of its players, instead of a copy per goal"""
+        if isinstance(goal.scored_by, Player):
+            goal.scored_by = self._players_by_name.setdefault(goal.scored_by.name, goal.scored_by)
+        if isinstance(goal.assisted_by, Player):
+            goal.assisted_by = self._players_by_name.setdefault(goal.assisted_by.name, goal.assisted_by)
@@ -1,42 +1,46 @@
+from typing import Optional
+
 from app.exceptions import ValidationError
-from app.models.goals import Goal, Score
+from app.models.goals import Goal
+from app.repositories.base.session import RepositorySession
 from app.repositories.base.validators import assert_in
 from app.repositories.goals.repo import GoalRepository
 from app.repositories.matches.repo import MatchRepository
 from app.repositories.players import PlayerRepository
 
 
-def validate_involved_players(goal, *_args):
+def validate_involved_players(goal, _repo=None, session: Optional[RepositorySession] = None):
     """Validate that the players involved in the goal are in the player repository"""
-    player_repo = PlayerRepository.load()
+    session = session or RepositorySession()
+    player_repo = session.get(PlayerRepository)
     if scoring_player := goal.scored_by:
         assert_in(scoring_player, player_repo)
     if assisting_player := goal.assisted_by:
         assert_in(assisting_player, player_repo)
 
 
-def validate_subsequent_goal(goal: Goal, repo: GoalRepository):
+def validate_subsequent_goal(goal: Goal, repo: GoalRepository, *_args):
     """Validate that the goal is the next goal in the match"""
-    match_goals = repo.get_by_match_date(goal.match_date)
-    if goal.order == 1 and not match_goals:
+    previous_goal = repo.get_last_goal(goal.match_date)
+    if goal.order == 1 and previous_goal is None:
         return
-    if not match_goals:
+    if previous_goal is None:
         raise ValidationError(f"Invalid goal: score {goal.score} cannot be the first score in a match")
-    previous_goal = max(match_goals)
     if goal.order != previous_goal.order + 1:
         raise ValidationError(f"Invalid goal: score {goal.score} cannot follow {previous_goal.score}")
 
 
-def validate_is_last_goal(goal: Goal, repo: GoalRepository):
+def validate_is_last_goal(goal: Goal, repo: GoalRepository, *_args):
     """Validate that the goal is the last goal in the match"""
     match_goals = repo.get_by_match_date(goal.match_date)
     if goal.order != len(match_goals):
         raise ValidationError("Not the last goal in the match")
 
 
-def validate_score(goal: Goal, goal_repo: GoalRepository):
+def validate_score(goal: Goal, goal_repo: GoalRepository, session: Optional[RepositorySession] = None):
     """Validate that the goal is added to the correct side of the score."""
-    match_repo = MatchRepository.load()
+    session = session or RepositorySession()
+    match_repo = session.get(MatchRepository)
     match = match_repo.get_by_match_date(goal.match_date)
 
     if match.is_home:
@@ -68,11 +72,7 @@ def _validate_goal_for_home_match(goal: Goal, repo: GoalRepository):
 
 
 def _get_score_changes(goal: Goal, repo: GoalRepository) -> tuple[bool, bool]:
-    match_goals = repo.get_by_match_date(goal.match_date)
-    if match_goals:
-        previous_score = max(match_goals).score
-    else:
-        previous_score = Score.construct(home=0, away=0)
+    previous_score = repo.get_current_score(goal.match_date)
 
     same_left = goal.score.home == previous_score.home
     same_right = goal.score.away == previous_score.away
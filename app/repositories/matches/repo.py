@@ -1,8 +1,15 @@
+from bisect import insort
 from datetime import date
+from typing import Callable, Optional
+
+from pydantic import BaseModel, PrivateAttr
 
 from app.exceptions import NotFoundError
 from app.models.matches import Match
 from app.repositories.base.repo import JsonRepository
+from app.repositories.base.session import RepositorySession
+from app.repositories.base.validators import assert_not_in
+from app.utils import iter_between_reversed, paginate
 
 
 class MatchRepository(JsonRepository):
@@ -10,14 +17,72 @@ class MatchRepository(JsonRepository):
 
     assets: list[Match] = []
 
+    # Matches by match date, which is unique for matches added through the repository
+    _matches_by_date: dict[date, list[Match]] = PrivateAttr(default_factory=dict)
+    # Sorted dates of the matches
+    _match_dates: list[date] = PrivateAttr(default_factory=list)
+
     class Config:
         """Pydantic configuration"""
 
         json_file_name = "matches.json"
 
+    def __contains__(self, asset: BaseModel) -> bool:
+        return asset.match_date in self._matches_by_date
+
+    def add(
+        self,
+        asset: Match,
+        validators: Optional[set[callable]] = None,
+        session: Optional[RepositorySession] = None,
+        prepare: Optional[Callable[[], object]] = None,
+    ):
+        """Add match to repository, making sure there is only one match per date"""
+        validators = set(validators or ())
+        validators.add(assert_not_in)
+        super().add(asset, validators, session, prepare)
+
     def get_by_match_date(self, match_date: date) -> Match:
         """Return a match by match date"""
-        if match_list := [match for match in self.assets if match.match_date == match_date]:
+        if match_list := self._matches_by_date.get(match_date):
             assert len(match_list) == 1, f"Multiple matches found for {match_date}"
             return match_list[0]
         raise NotFoundError(f"No match found for {match_date}")
+
+    def get_page(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> list[Match]:
+        """Return a page of the matches played between start and end (inclusive), newest first"""
+        matches = (
+            match
+            for match_date in iter_between_reversed(self._match_dates, start, end)
+            for match in self._matches_by_date[match_date]
+        )
+        return paginate(matches, offset, limit)
+
+    def _build_indexes(self):
+        self._matches_by_date = {}
+        self._match_dates = []
+        for match in self.assets:
+            self._index_asset(match)
+
+    def _copy_indexes(self, source: "MatchRepository"):
+        # pylint: disable=protected-access
+        self._matches_by_date = {match_date: list(matches) for match_date, matches in source._matches_by_date.items()}
+        self._match_dates = list(source._match_dates)
+
+    def _index_asset(self, asset: Match):
+        if asset.match_date not in self._matches_by_date:
+            insort(self._match_dates, asset.match_date)
+        self._matches_by_date.setdefault(asset.match_date, []).append(asset)
+
+    def _unindex_asset(self, asset: Match):
+        match_list = self._matches_by_date[asset.match_date]
+        match_list.remove(asset)
+        if not match_list:
+            del self._matches_by_date[asset.match_date]
+            self._match_dates.remove(asset.match_date)
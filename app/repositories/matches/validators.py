@@ -1,9 +1,13 @@
+from typing import Optional
+
 from app.models.matches import Match
+from app.repositories.base.session import RepositorySession
 from app.repositories.base.validators import assert_in
 from app.repositories.opponents import OpponentRepository
 
 
-def validate_opponent_exists(match: Match, *_args):
+def validate_opponent_exists(match: Match, _repo=None, session: Optional[RepositorySession] = None):
     """Validate that the opponent exists in the opponent repository"""
-    opponent_repo = OpponentRepository.load()
+    session = session or RepositorySession()
+    opponent_repo = session.get(OpponentRepository)
     assert_in(match.opponent, opponent_repo)
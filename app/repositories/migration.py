@@ -0,0 +1,21 @@
+"""Migration of the repositories from json files to another storage mode"""
+from app.repositories.base.repo import JsonRepository
+from app.settings.repository import StorageMode, repo_settings_provider
+
+
+def migrate_json(repo_classes: tuple[type[JsonRepository], ...], storage_mode: StorageMode) -> dict[str, int]:
+    """
+    Copy the assets of the repositories stored in json files, and their journals, to another storage mode, returning
+    the asset counts
+    """
+    migrated = {}
+    for repo_class in repo_classes:
+        with repo_settings_provider.override(storage_mode=StorageMode.JOURNAL):
+            repo = repo_class.load()
+            if not repo.is_stored():
+                continue
+
+        with repo_settings_provider.override(storage_mode=storage_mode):
+            repo.save()
+        migrated[repo_class.Config.json_file_name] = len(repo.assets)
+    return migrated
@@ -0,0 +1,74 @@
+from operator import methodcaller
+from typing import TYPE_CHECKING
+
+from pydantic import PrivateAttr
+
+from app.models.goals import CountType, Goal
+from app.models.player_counts import PlayerCount
+from app.models.players import Player
+from app.repositories.base.repo import JsonRepository, Operation
+
+if TYPE_CHECKING:
+    from app.repositories.goals.repo import GoalRepository
+
+
+class PlayerCountRepository(JsonRepository):
+    """Repository for the goal and assist counts of players, kept up-to-date by the goal repository"""
+
+    assets: list[PlayerCount] = []
+    # Version of the goal repository the counts are up-to-date with, since the counts are only changed by saving them
+    version: int = 0
+
+    _counts_by_player: dict[Player, PlayerCount] = PrivateAttr(default_factory=dict)
+    _leaderboards: dict[CountType, list[PlayerCount]] = PrivateAttr(default_factory=dict)
+
+    class Config:
+        """Pydantic configuration"""
+
+        json_file_name = "player_counts.json"
+
+    @classmethod
+    def from_goals(cls, goal_repo: "GoalRepository"):
+        """Count the goals and assists of every player from scratch"""
+        repo = cls()
+        repo.apply_changes([(Operation.ADD, goal) for goal in goal_repo.assets])
+        return repo
+
+    def apply_changes(self, changes: list[tuple[Operation, Goal]]):
+        """Update the counts with goals that were added to or removed from the goal repository"""
+        changed_counts = {}
+        for operation, goal in changes:
+            change = 1 if operation is Operation.ADD else -1
+            if goal.scored_by:
+                self._get_changed_count(changed_counts, goal.scored_by).goals += change
+            if goal.assisted_by:
+                self._get_changed_count(changed_counts, goal.assisted_by).assists += change
+
+        self.assets = [count for count in self._counts_by_player.values() if count.goals or count.assists]
+
+    def get_leaderboard(self, count_type: CountType) -> list[PlayerCount]:
+        """Return the counts of all players, sorted by goals or assists and then by name"""
+        return list(self._leaderboards.get(count_type, []))
+
+    def _get_changed_count(self, changed_counts: dict[Player, PlayerCount], player: Player) -> PlayerCount:
+        """
+        Get the count of a player to change, which replaces the count of the player by a copy first, since the counts
+        are shared with the cached repository and the other loaded copies of it
+        """
+        if (player_count := changed_counts.get(player)) is None:
+            stored_count = self._counts_by_player.get(player)
+            player_count = stored_count.copy() if stored_count else PlayerCount(player=player)
+            changed_counts[player] = self._counts_by_player[player] = player_count
+        return player_count
+
+    def _build_indexes(self):
+        self._counts_by_player = {count.player: count for count in self.assets}
+        by_name = sorted(self.assets, key=lambda count: count.player.name.lower())
+        self._leaderboards = {
+            count_type: sorted(by_name, key=methodcaller("get", count_type), reverse=True) for count_type in CountType
+        }
+
+    def _copy_indexes(self, source: "PlayerCountRepository"):
+        # pylint: disable=protected-access
+        self._counts_by_player = dict(source._counts_by_player)
+        self._leaderboards = {count_type: list(leaderboard) for count_type, leaderboard in source._leaderboards.items()}
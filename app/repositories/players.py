@@ -1,3 +1,5 @@
+from pydantic import BaseModel, PrivateAttr
+
 from app.models.players import Player
 from app.repositories.base.repo import JsonRepository
 
@@ -7,7 +9,27 @@ class PlayerRepository(JsonRepository):
 
     assets: list[Player] = []
 
+    # Players by their normalized name
+    _players_by_key: dict[str, Player] = PrivateAttr(default_factory=dict)
+
     class Config:
         """Pydantic configuration"""
 
         json_file_name = "players.json"
+
+    def __contains__(self, asset: BaseModel) -> bool:
+        if isinstance(asset, Player):
+            return asset.key in self._players_by_key
+        return super().__contains__(asset)
+
+    def _build_indexes(self):
+        self._players_by_key = {player.key: player for player in self.assets}
+
+    def _copy_indexes(self, source: "PlayerRepository"):
+        self._players_by_key = dict(source._players_by_key)  # pylint: disable=protected-access
+
+    def _index_asset(self, asset: Player):
+        self._players_by_key.setdefault(asset.key, asset)
+
+    def _unindex_asset(self, asset: Player):
+        self._players_by_key.pop(asset.key, None)
@@ -0,0 +1,22 @@
+"""
+Migration of the repositories with a shard attribute from json files to one json file per shard.
+
+Run from the root of the project, with the settings of the environment to migrate:
+    python -m app.repositories.sharded_migration
+"""
+from app.repositories.base.repo import JsonRepository
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.migration import migrate_json
+from app.settings.repository import StorageMode
+
+REPOSITORY_CLASSES: tuple[type[JsonRepository], ...] = (GoalRepository,)
+
+
+def migrate_json_to_shards() -> dict[str, int]:
+    """Copy the assets of every sharded repository stored in a json file to its shards, returning the asset counts"""
+    return migrate_json(REPOSITORY_CLASSES, StorageMode.SHARDED)
+
+
+if __name__ == "__main__":
+    for json_file_name, asset_count in migrate_json_to_shards().items():
+        print(f"Migrated {asset_count} assets from {json_file_name}")
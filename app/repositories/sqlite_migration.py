@@ -0,0 +1,32 @@
+"""
+Migration of the repositories from json files to the SQLite database.
+
+Run from the root of the project, with the settings of the environment to migrate:
+    python -m app.repositories.sqlite_migration
+"""
+from app.repositories.base.repo import JsonRepository
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.matches.repo import MatchRepository
+from app.repositories.migration import migrate_json
+from app.repositories.opponents import OpponentRepository
+from app.repositories.player_counts import PlayerCountRepository
+from app.repositories.players import PlayerRepository
+from app.settings.repository import StorageMode
+
+REPOSITORY_CLASSES: tuple[type[JsonRepository], ...] = (
+    PlayerRepository,
+    OpponentRepository,
+    MatchRepository,
+    GoalRepository,
+    PlayerCountRepository,
+)
+
+
+def migrate_json_to_sqlite() -> dict[str, int]:
+    """Copy the assets of every repository stored in json files to the SQLite database, returning the asset counts"""
+    return migrate_json(REPOSITORY_CLASSES, StorageMode.SQLITE)
+
+
+if __name__ == "__main__":
+    for json_file_name, asset_count in migrate_json_to_sqlite().items():
+        print(f"Migrated {asset_count} assets from {json_file_name}")
@@ -6,6 +6,7 @@ from pydantic import BaseModel
 from app.models.goals import CountType
 from app.models.players import Player
 from app.repositories.goals.repo import GoalRepository
+from app.repositories.player_counts import PlayerCountRepository
 from app.repositories.players import PlayerRepository
 
 
@@ -26,19 +27,28 @@ class StatRepository(BaseModel):
 
     @classmethod
     def from_goals(cls, count_type: CountType):
-        """Create a repository of stats from goals"""
-        goals = GoalRepository.load()
-        players = PlayerRepository.load().assets
-        player_counts = goals.get_player_counts(count_type)
+        """Create a repository of stats from the player counts that are kept up-to-date with the goals"""
+        count_repo = PlayerCountRepository.load()
+        if not count_repo.is_stored():
+            count_repo = PlayerCountRepository.from_goals(GoalRepository.load())
+        leaderboard = count_repo.get_leaderboard(count_type)
 
-        for player in players:
-            if player not in player_counts:
-                player_counts[player] = 0
+        counted_players = {player_count.player for player_count in leaderboard}
+        players = [player for player in PlayerRepository.load().assets if player not in counted_players]
 
         counter_class = cls.get_counter_class(count_type)
-        repo = cls(stats=[counter_class(player=player, count=count) for player, count in player_counts.items()])
-        repo.stats = sorted(repo.stats, key=lambda stat: stat.count, reverse=True)
-        return repo
+        stats = [counter_class(player=count.player, count=count.get(count_type)) for count in leaderboard]
+        stats += [counter_class(player=player, count=0) for player in players]
+        return cls(stats=stats)
+
+    @classmethod
+    def get_content_version(cls) -> str:
+        """Return an identifier of the stored data the stats are created from, without loading it"""
+        content_hashes = [PlayerCountRepository.get_content_hash(), PlayerRepository.get_content_hash()]
+        if content_hashes[0] is None:
+            # Without stored player counts, the stats are counted from the goals
+            content_hashes.append(GoalRepository.get_content_hash())
+        return ":".join(map(str, content_hashes))
 
     @classmethod
     def create_dummy(cls, count_type: CountType):
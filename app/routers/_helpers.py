@@ -1,30 +1,131 @@
-from fastapi import HTTPException
+import hashlib
+import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from typing import Annotated, Any, Awaitable, Callable, Optional
+
+from fastapi import Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
 from starlette import status
 
-from app.exceptions import ValidationError
+from app.exceptions import ValidationError, WriteConflictError
 from app.repositories.base.repo import JsonRepository
+from app.repositories.base.session import RepositorySession, get_repository_session
+from app.settings.api import get_api_settings
 
+# Repository session shared by everything that handles one request
+Session = Annotated[RepositorySession, Depends(get_repository_session)]
+
+# Query parameters to page through assets, newest first
+DateFrom = Annotated[Optional[date], Query(alias="from", description="Earliest match date (inclusive)")]
+DateTo = Annotated[Optional[date], Query(alias="to", description="Latest match date (inclusive)")]
+Offset = Annotated[int, Query(ge=0, description="Number of items to skip")]
+
+# Serialized response bodies by ETag, least recently used first
+_SERIALIZED_RESPONSES: OrderedDict[str, bytes] = OrderedDict()
 
-def add_or_raise_http_exception(repo: JsonRepository, asset: BaseModel, validators: set[callable]):
-    """Add asset to repository"""
+
+@contextmanager
+def raise_http_exception():
+    """Raise repository errors as HTTP exceptions"""
 
     try:
-        repo.add(asset, validators=validators)
-    except ValidationError as error:
+        yield
+    except (ValidationError, WriteConflictError) as error:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=[{"msg": str(error)}]) from error
     except PermissionError as error:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=[{"msg": str(error)}]) from error
+
+
+async def add_or_raise_http_exception(
+    repo: JsonRepository,
+    asset: BaseModel,
+    validators: set[callable],
+    session: Optional[RepositorySession] = None,
+    prepare: Optional[Callable[[], object]] = None,
+):
+    """Add asset to repository"""
+
+    with raise_http_exception():
+        await repo.add_async(asset, validators=validators, session=session, prepare=prepare)
     return asset
 
 
-def remove_or_raise_http_exception(repo: JsonRepository, asset: BaseModel, validators: set[callable]):
+async def remove_or_raise_http_exception(
+    repo: JsonRepository,
+    asset: BaseModel,
+    validators: set[callable],
+    session: Optional[RepositorySession] = None,
+):
     """Remove asset from repository"""
 
-    try:
-        repo.remove(asset, validators=validators)
-    except ValidationError as error:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=[{"msg": str(error)}]) from error
-    except PermissionError as error:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=[{"msg": str(error)}]) from error
+    with raise_http_exception():
+        await repo.remove_async(asset, validators=validators, session=session)
     return asset
+
+
+async def conditional_json_response(
+    request: Request,
+    content_version: str,
+    get_content: Callable[[], Awaitable[Any]],
+) -> Response:
+    """
+    Respond with the content as json, tagged with an ETag derived from the version of the content.
+
+    When the client already has that version, respond with 304 Not Modified without getting the content.
+    The serialized content is cached per ETag, so unchanged content is served without getting it again.
+    """
+    etag_source = f"{request.url.path}?{request.url.query}#{content_version}"
+    etag = f'"{hashlib.sha256(etag_source.encode()).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if _etag_matches(etag, request.headers.get("If-None-Match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = _SERIALIZED_RESPONSES.get(etag)
+    if body is None:
+        body = serialize_json(await get_content())
+        _cache_serialized_response(etag, body)
+    else:
+        _SERIALIZED_RESPONSES.move_to_end(etag)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def serialize_json(content: Any) -> bytes:
+    """
+    Serialize content to json the way FastAPI's JSONResponse does.
+
+    Models are serialized with their own dict(), without walking the result through jsonable_encoder first.
+    """
+    return json.dumps(
+        content,
+        default=pydantic_encoder,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def clear_response_cache():
+    """Forget all serialized responses"""
+    _SERIALIZED_RESPONSES.clear()
+
+
+def _cache_serialized_response(etag: str, body: bytes):
+    max_size = get_api_settings().response_cache_size
+    if max_size <= 0:
+        return
+    _SERIALIZED_RESPONSES[etag] = body
+    while len(_SERIALIZED_RESPONSES) > max_size:
+        _SERIALIZED_RESPONSES.popitem(last=False)
+
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    client_etags = {client_etag.strip().removeprefix("W/") for client_etag in if_none_match.split(",")}
+    return "*" in client_etags or etag in client_etags
@@ -1,10 +1,14 @@
 from datetime import date
+from functools import partial
+from typing import Annotated, Callable, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
 from starlette import status
 
 from app.auth import api_key_read_access_auth, api_key_write_access_auth
+from app.concurrency import run_blocking, write_lock
 from app.models.goals import Goal
+from app.models.matches import Match
 from app.repositories.goals.repo import GoalRepository
 from app.repositories.goals.validators import (
     validate_involved_players,
@@ -14,18 +18,47 @@ from app.repositories.goals.validators import (
 )
 from app.repositories.matches.repo import MatchRepository
 from app.routers._helpers import (
+    DateFrom,
+    DateTo,
+    Offset,
+    Session,
     add_or_raise_http_exception,
+    conditional_json_response,
+    raise_http_exception,
     remove_or_raise_http_exception,
 )
 
 router = APIRouter()
 
 
+@router.get("", dependencies=[Depends(api_key_read_access_auth)])
+async def list_goals(
+    request: Request,
+    start: DateFrom = None,
+    end: DateTo = None,
+    offset: Offset = 0,
+    limit: Annotated[int, Query(ge=1, le=1000, description="Maximum number of goals")] = 100,
+):
+    """List goals, newest first."""
+
+    async def _list_goals():
+        goals = await GoalRepository.load_async()
+        return goals.get_page(start, end, offset, limit)
+
+    content_version = await GoalRepository.get_content_hash_async()
+    return await conditional_json_response(request, content_version, _list_goals)
+
+
 @router.get("/{match_date}", dependencies=[Depends(api_key_read_access_auth)])
-async def get_by_match_date(match_date: date):
+async def get_by_match_date(request: Request, match_date: date):
     """Get goals by match date."""
-    goals = GoalRepository.load()
-    return goals.get_by_match_date(match_date)
+
+    async def _get_by_match_date():
+        goals = await GoalRepository.load_shard_async(str(match_date))
+        return goals.get_by_match_date(match_date)
+
+    content_version = await GoalRepository.get_content_hash_async(shard_key=str(match_date))
+    return await conditional_json_response(request, content_version, _get_by_match_date)
 
 
 @router.post(
@@ -33,28 +66,70 @@ async def get_by_match_date(match_date: date):
     dependencies=[Depends(api_key_write_access_auth)],
     status_code=status.HTTP_201_CREATED,
 )
-async def add_goal(goal: Goal):
+async def add_goal(goal: Goal, session: Session):
     """Add a goal."""
-    goal_repo = GoalRepository.load()
+    validators = {
+        validate_involved_players,
+        validate_subsequent_goal,
+        validate_score,
+    }
+
+    async with write_lock(GoalRepository):
+        goal_repo = await session.get_async(GoalRepository)
+
+        match_repo = await session.get_async(MatchRepository)
+        match = match_repo.get_by_match_date(goal.match_date)
+
+        await add_or_raise_http_exception(goal_repo, goal, validators, session, _score_goal(goal_repo, goal, match))
+    return goal
 
-    match_repo = MatchRepository.load()
-    match = match_repo.get_by_match_date(goal.match_date)
-    if goal.score is None:
-        goal.score = goal_repo.get_next_score(goal, match)
 
+@router.post(
+    "/batch",
+    dependencies=[Depends(api_key_write_access_auth)],
+    status_code=status.HTTP_201_CREATED,
+)
+async def add_goals(goals: list[Goal], session: Session):
+    """Add the goals of a match at once, in the order they were scored."""
     validators = {
         validate_involved_players,
         validate_subsequent_goal,
         validate_score,
     }
 
-    add_or_raise_http_exception(goal_repo, goal, validators)
-    return goal
+    async with write_lock(GoalRepository):
+        goal_repo = await session.get_async(GoalRepository)
+        match_repo = await session.get_async(MatchRepository)
+
+        def _add_goals():
+            with raise_http_exception(), goal_repo.batch():
+                for goal in goals:
+                    match = match_repo.get_by_match_date(goal.match_date)
+                    prepare = _score_goal(goal_repo, goal, match)
+                    goal_repo.add(goal, validators=validators, session=session, prepare=prepare)
+
+        await run_blocking(_add_goals)
+    return goals
 
 
 @router.delete("", dependencies=[Depends(api_key_write_access_auth)])
-async def remove_goal(goal: Goal):
+async def remove_goal(goal: Goal, session: Session):
     """Remove a goal."""
-    repo = GoalRepository.load()
-    remove_or_raise_http_exception(repo, goal, {validate_is_last_goal})
+    async with write_lock(GoalRepository):
+        repo = await session.get_async(GoalRepository)
+        await remove_or_raise_http_exception(repo, goal, {validate_is_last_goal}, session)
     return goal
+
+
+def _score_goal(goal_repo: GoalRepository, goal: Goal, match: Match) -> Optional[Callable[[], None]]:
+    """
+    Get how to set the score of a goal without one to the score after it, which is set again when the goal is added on
+    top of the goals of another writer
+    """
+    if goal.score is not None:
+        return None
+    return partial(_set_next_score, goal_repo, goal, match)
+
+
+def _set_next_score(goal_repo: GoalRepository, goal: Goal, match: Match):
+    goal.score = goal_repo.get_next_score(goal, match)
@@ -1,33 +1,82 @@
-from typing import Annotated
+from datetime import date
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from starlette import status
 
 from app.auth import AccessLevel, api_key_read_access_auth, api_key_write_access_auth
+from app.concurrency import write_lock
+from app.exceptions import NotFoundError
 from app.models.matches import Match
 from app.repositories.base.validators import assert_not_in
+from app.repositories.goals.repo import GoalRepository
 from app.repositories.matches.repo import MatchRepository
 from app.repositories.matches.validators import validate_opponent_exists
 from app.routers._helpers import (
+    DateFrom,
+    DateTo,
+    Offset,
+    Session,
     add_or_raise_http_exception,
+    conditional_json_response,
     remove_or_raise_http_exception,
 )
 from app.settings.api import get_api_settings
+from app.utils import paginate
 
 router = APIRouter()
 
+# Number of most recent matches visible when spoilers are hidden
+_SPOILER_FREE_MATCHES = 5
+
 
 @router.get("")
-async def list_matches(access_level: Annotated[AccessLevel, Depends(api_key_read_access_auth)]):
-    """List all matches."""
-    matches = MatchRepository.load().assets
+async def list_matches(  # pylint: disable=too-many-arguments
+    request: Request,
+    access_level: Annotated[AccessLevel, Depends(api_key_read_access_auth)],
+    start: DateFrom = None,
+    end: DateTo = None,
+    offset: Offset = 0,
+    limit: Annotated[Optional[int], Query(ge=1, description="Maximum number of matches")] = None,
+):
+    """List matches, newest first."""
+    settings = get_api_settings()
+    hide_spoilers = access_level is AccessLevel.READ and settings.hide_spoilers
 
-    matches.sort(reverse=True)
+    async def _list_matches():
+        repo = await MatchRepository.load_async()
 
-    settings = get_api_settings()
-    if access_level is AccessLevel.READ and settings.hide_spoilers:
-        return matches[:5]
-    return matches
+        if hide_spoilers:
+            matches = [
+                match
+                for match in repo.get_page(limit=_SPOILER_FREE_MATCHES)
+                if (start is None or match.match_date >= start) and (end is None or match.match_date <= end)
+            ]
+            return paginate(matches, offset, limit)
+        return repo.get_page(start, end, offset, limit)
+
+    content_version = f"{await MatchRepository.get_content_hash_async()}:{hide_spoilers}"
+    return await conditional_json_response(request, content_version, _list_matches)
+
+
+@router.get("/{match_date}/timeline", dependencies=[Depends(api_key_read_access_auth)])
+async def get_timeline(request: Request, match_date: date):
+    """Get the goals of a match in the order they were scored, with the score after each goal and the result."""
+    shard_key = str(match_date)
+
+    async def _get_timeline():
+        match_repo = await MatchRepository.load_async()
+        try:
+            match = match_repo.get_by_match_date(match_date)
+        except NotFoundError as error:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=[{"msg": str(error)}]) from error
+
+        goal_repo = await GoalRepository.load_shard_async(shard_key)
+        return goal_repo.get_timeline(match)
+
+    match_hash = await MatchRepository.get_content_hash_async()
+    goal_hash = await GoalRepository.get_content_hash_async(shard_key=shard_key)
+    return await conditional_json_response(request, f"{match_hash}:{goal_hash}", _get_timeline)
 
 
 @router.post(
@@ -35,10 +84,13 @@ async def list_matches(access_level: Annotated[AccessLevel, Depends(api_key_read
     dependencies=[Depends(api_key_write_access_auth)],
     status_code=status.HTTP_201_CREATED,
 )
-async def add_match(match: Match):
+async def add_match(match: Match, session: Session):
     """Add a match."""
-    repo = MatchRepository.load()
-    add_or_raise_http_exception(repo, match, validators={assert_not_in, validate_opponent_exists})
+    async with write_lock(MatchRepository):
+        repo = await session.get_async(MatchRepository)
+        await add_or_raise_http_exception(
+            repo, match, validators={assert_not_in, validate_opponent_exists}, session=session
+        )
     return match
 
 
@@ -47,8 +99,9 @@ async def add_match(match: Match):
     dependencies=[Depends(api_key_write_access_auth)],
     status_code=status.HTTP_204_NO_CONTENT,
 )
-async def remove_match(match: Match):
+async def remove_match(match: Match, session: Session):
     """Delete a match."""
-    repo = MatchRepository.load()
-    remove_or_raise_http_exception(repo, match, validators=set())
+    async with write_lock(MatchRepository):
+        repo = await session.get_async(MatchRepository)
+        await remove_or_raise_http_exception(repo, match, validators=set(), session=session)
     return match
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.auth import api_key_read_access_auth
+from app.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("", dependencies=[Depends(api_key_read_access_auth)], response_class=PlainTextResponse)
+async def get_metrics():
+    """Get the timings of requests and their phases in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
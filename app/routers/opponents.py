@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from starlette import status
 
 from app.auth import api_key_read_access_auth, api_key_write_access_auth
+from app.concurrency import write_lock
 from app.models.opponents import Opponent
 from app.repositories.base.validators import assert_not_in
 from app.repositories.opponents import OpponentRepository
-from app.routers._helpers import add_or_raise_http_exception
+from app.routers._helpers import add_or_raise_http_exception, conditional_json_response
 
 router = APIRouter()
 
@@ -17,12 +18,18 @@ router = APIRouter()
 )
 async def add_opponent(opponent: Opponent):
     """Add an opponent."""
-    repo = OpponentRepository.load()
-    add_or_raise_http_exception(repo, opponent, {assert_not_in})
+    async with write_lock(OpponentRepository):
+        repo = await OpponentRepository.load_async()
+        await add_or_raise_http_exception(repo, opponent, {assert_not_in})
     return opponent
 
 
 @router.get("", dependencies=[Depends(api_key_read_access_auth)])
-async def list_opponents():
+async def list_opponents(request: Request):
     """List all opponents."""
-    return OpponentRepository.load().assets
+
+    async def _list_opponents():
+        return (await OpponentRepository.load_async()).assets
+
+    content_version = await OpponentRepository.get_content_hash_async()
+    return await conditional_json_response(request, content_version, _list_opponents)
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from starlette import status
 
 from app.auth import api_key_read_access_auth, api_key_write_access_auth
+from app.concurrency import write_lock
 from app.models.players import Player
 from app.repositories.base.validators import assert_not_in
 from app.repositories.players import PlayerRepository
-from app.routers._helpers import add_or_raise_http_exception
+from app.routers._helpers import add_or_raise_http_exception, conditional_json_response
 
 router = APIRouter()
 
@@ -17,13 +18,19 @@ router = APIRouter()
 )
 async def add_player(player: Player):
     """Add a player."""
-    repo = PlayerRepository.load()
-    add_or_raise_http_exception(repo, player, {assert_not_in})
+    async with write_lock(PlayerRepository):
+        repo = await PlayerRepository.load_async()
+        await add_or_raise_http_exception(repo, player, {assert_not_in})
     return player
 
 
 @router.get("", dependencies=[Depends(api_key_read_access_auth)])
-async def list_players():
+async def list_players(request: Request):
     """List all players."""
-    players = PlayerRepository.load().assets
-    return sorted(players, key=lambda player: player.name)
+
+    async def _list_players():
+        players = (await PlayerRepository.load_async()).assets
+        return sorted(players, key=lambda player: player.name)
+
+    content_version = await PlayerRepository.get_content_hash_async()
+    return await conditional_json_response(request, content_version, _list_players)
@@ -1,28 +1,38 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
 from app.auth import AccessLevel, api_key_read_access_auth
+from app.concurrency import run_blocking
 from app.models.goals import CountType
 from app.repositories.stats import StatRepository
+from app.routers._helpers import conditional_json_response
 from app.settings.api import get_api_settings
 
 router = APIRouter()
 
 
 @router.get("/top_assists")
-async def top_assists(access_level: Annotated[AccessLevel, Depends(api_key_read_access_auth)]):
+async def top_assists(request: Request, access_level: Annotated[AccessLevel, Depends(api_key_read_access_auth)]):
     """Get the top assists"""
     settings = get_api_settings()
     if access_level is AccessLevel.READ and settings.hide_spoilers:
-        return StatRepository.create_dummy(count_type=CountType.ASSIST).stats
-    return StatRepository.from_goals(count_type=CountType.ASSIST).stats
+        return (await run_blocking(StatRepository.create_dummy, count_type=CountType.ASSIST)).stats
+    return await _conditional_stats_response(request, CountType.ASSIST)
 
 
 @router.get("/top_goals")
-async def top_goals(access_level: Annotated[AccessLevel, Depends(api_key_read_access_auth)]):
+async def top_goals(request: Request, access_level: Annotated[AccessLevel, Depends(api_key_read_access_auth)]):
     """Get the top goals"""
     settings = get_api_settings()
     if access_level is AccessLevel.READ and settings.hide_spoilers:
-        return StatRepository.create_dummy(count_type=CountType.GOAL).stats
-    return StatRepository.from_goals(count_type=CountType.GOAL).stats
+        return (await run_blocking(StatRepository.create_dummy, count_type=CountType.GOAL)).stats
+    return await _conditional_stats_response(request, CountType.GOAL)
+
+
+async def _conditional_stats_response(request: Request, count_type: CountType):
+    async def _get_stats():
+        return (await run_blocking(StatRepository.from_goals, count_type=count_type)).stats
+
+    content_version = await run_blocking(StatRepository.get_content_version)
+    return await conditional_json_response(request, content_version, _get_stats)
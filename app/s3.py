@@ -1,41 +1,438 @@
 """S3 bucket for assets"""
+import json
 import logging
-from typing import Optional
-
-import boto3
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional
 
+from app.exceptions import WriteConflictError
+from app.metrics import timed
 from app.settings.repository import get_repo_settings
+from app.utils import write_file_atomically
+
+# boto3 is imported on first use, since importing it adds a lot to the cold start of the API
+if TYPE_CHECKING:
+    from botocore.client import BaseClient
+    from botocore.exceptions import ClientError
+
+
+class _PendingUpload(NamedTuple):
+    bucket: "S3AssetBucket"
+    conditional: bool
+    expected_etag: Optional[str]
 
 
 class S3AssetBucket:
     """S3 bucket for assets"""
 
-    def __init__(self, bucket_name: str, client: Optional[boto3.client] = None):
-        self.s3_client = client or boto3.client("s3")
+    # ETag per (bucket name, s3 path) of the object the local copy was last synced with, or None when the object did
+    # not exist, shared by all bucket instances
+    _etags: dict[tuple[str, str], Optional[str]] = {}
+
+    # Uploads deferred in the write-behind mode per (bucket name, file name), with the ETag the first one expected
+    _pending_uploads: dict[tuple[str, str], _PendingUpload] = {}
+    # Number of uploads deferred since the last flush
+    _pending_count = 0
+    _pending_lock = threading.RLock()
+    _flush_timer: Optional[threading.Timer] = None
+
+    # Directories of which the outbox was read into the pending uploads, after a restart
+    _restored_outboxes: set[Path] = set()
+    # Wakes up the worker that uploads the outbox in the background, which is started on first use
+    _drain_requested = threading.Event()
+    _drain_worker: Optional[threading.Thread] = None
+    # Stops the current worker that uploads the outbox
+    _drain_stopped: Optional[threading.Event] = None
+
+    _shared_client: Optional["BaseClient"] = None
+    _shared_client_lock = threading.Lock()
+
+    def __init__(self, bucket_name: str, client: Optional["BaseClient"] = None):
+        self._client = client
         self.bucket_name = bucket_name
 
-    def download_asset(self, file_name: str):
-        """Download asset from S3 bucket"""
+    @property
+    def s3_client(self) -> "BaseClient":
+        """Get the S3 client of the bucket"""
+        return self._client or self.shared_client()
+
+    @classmethod
+    def shared_client(cls) -> "BaseClient":
+        """Get the S3 client shared by all buckets, creating it on first use"""
+        if cls._shared_client is None:
+            with cls._shared_client_lock:
+                if cls._shared_client is None:
+                    # pylint: disable=import-outside-toplevel
+                    import boto3
+                    from botocore.config import Config
+
+                    settings = get_repo_settings()
+                    config = Config(max_pool_connections=settings.s3_max_pool_connections, tcp_keepalive=True)
+                    client = boto3.client("s3", config=config)
+                    _support_conditional_writes(client)
+                    cls._shared_client = client
+        return cls._shared_client
+
+    def download_asset(self, file_name: str, missing_ok: bool = False):
+        """Download asset from S3 bucket, unless the local copy is already up-to-date"""
         settings = get_repo_settings()
 
         if not settings.s3_access:
             logging.warning("Download skipped: S3 access is disabled in settings")
             return
 
+        if settings.upload_outbox:
+            self._restore_outbox()
+        if (self.bucket_name, file_name) in self._pending_uploads:
+            # The local copy has changes that are not uploaded yet, which the outbox uploads first
+            if not settings.upload_outbox or not self.flush_uploads():
+                return
+
         local_path = f"{settings.local_assets_dir}/{file_name}"
         s3_path = f"{settings.s3_assets_dir}/{file_name}"
 
-        self.s3_client.download_file(self.bucket_name, s3_path, local_path)
+        request = {"Bucket": self.bucket_name, "Key": s3_path}
+        etag = self._etags.get((self.bucket_name, s3_path))
+        if etag and os.path.exists(local_path):
+            request["IfNoneMatch"] = etag
+
+        # pylint: disable=import-outside-toplevel
+        from botocore.exceptions import ClientError
+
+        with timed("s3_download"):
+            try:
+                response = self.s3_client.get_object(**request)
+            except ClientError as error:
+                if _is_not_modified(error):
+                    return
+                if missing_ok and _is_missing(error):
+                    self._etags[(self.bucket_name, s3_path)] = None
+                    return
+                raise
+
+            write_file_atomically(Path(local_path), response["Body"].read())
+
+        self._etags[(self.bucket_name, s3_path)] = response["ETag"]
 
-    def upload_asset(self, file_name: str):
-        """Upload asset to S3 bucket"""
+    def upload_asset(
+        self,
+        file_name: str,
+        conditional: bool = False,
+        expected_etag: Optional[str] = None,
+        body: Optional[bytes] = None,
+    ):
+        """
+        Upload asset to S3 bucket, with the given body or else the content of the local copy.
+
+        The body is what the writer wrote to the local copy, which another writer may replace before it is uploaded.
+        A conditional upload only replaces the object with the expected ETag, or only creates the object when no ETag
+        is expected. It raises a WriteConflictError when another writer changed the object in the meantime.
+
+        With the outbox or in the write-behind mode the upload is deferred instead, see defer_upload. Deferred uploads
+        upload the content of the local copy when they are flushed, so the body is not kept.
+        """
         settings = get_repo_settings()
 
         if not settings.s3_access:
             logging.warning("Upload skipped: S3 access is disabled in settings")
             return
 
-        local_path = f"{settings.local_assets_dir}/{file_name}"
+        if settings.upload_outbox or settings.write_behind_window > 0:
+            self.defer_upload(file_name)
+            return
+        self._upload_now(file_name, conditional, expected_etag, body)
+
+    def defer_upload(self, file_name: str):
+        """
+        Defer the upload of an asset, so successive writes of it are uploaded at once.
+
+        With the outbox, the deferred uploads are recorded in a file in the local assets directory, and uploaded right
+        away by a background worker, which retries failed uploads. Otherwise they are flushed when the write-behind
+        window has passed since the first one was deferred, or when the configured number of uploads is deferred.
+
+        The deferred uploads are conditional on the ETag the local copy was synced with when the first one was
+        deferred, so they do not overwrite the changes of other processes.
+        """
+        settings = get_repo_settings()
         s3_path = f"{settings.s3_assets_dir}/{file_name}"
 
-        self.s3_client.upload_file(local_path, self.bucket_name, s3_path)
+        if settings.upload_outbox:
+            self._restore_outbox()
+
+        with self._pending_lock:
+            # Moved to the end, so the assets are uploaded in the order they were last written, like an index after the
+            # files it refers to
+            pending_upload = self._pending_uploads.pop((self.bucket_name, file_name), None)
+            if pending_upload is None:
+                key = (self.bucket_name, s3_path)
+                pending_upload = _PendingUpload(self, key in self._etags, self._etags.get(key))
+            self._pending_uploads[(self.bucket_name, file_name)] = pending_upload
+            S3AssetBucket._pending_count += 1
+
+            if settings.upload_outbox:
+                _write_outbox(self._pending_uploads)
+                self._request_drain()
+                return
+
+            flush_now = self._pending_count >= settings.write_behind_max_writes
+            if not flush_now and self._flush_timer is None:
+                S3AssetBucket._flush_timer = threading.Timer(settings.write_behind_window, self.flush_uploads)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+        if flush_now:
+            self.flush_uploads()
+
+    @classmethod
+    def flush_uploads(cls) -> bool:
+        """
+        Upload the deferred uploads, returning whether all of them were uploaded.
+
+        An upload that conflicts with the changes of another process cannot be made anymore. The content of its local
+        copy is kept as a dead letter, so the changes are not lost, and the local copy is downloaded again on the next
+        load. Other errors leave the failed upload and the ones after it pending.
+        """
+        settings = get_repo_settings()
+        # Successive writes wait for the flush, so they are deferred on the condition of the uploaded versions
+        with cls._pending_lock:
+            S3AssetBucket._pending_count = 0
+            if cls._flush_timer is not None:
+                cls._flush_timer.cancel()
+                S3AssetBucket._flush_timer = None
+
+            while cls._pending_uploads:
+                (_, file_name), (bucket, conditional, expected_etag) = next(iter(cls._pending_uploads.items()))
+                try:
+                    bucket._upload_now(file_name, conditional, expected_etag)  # pylint: disable=protected-access
+                except WriteConflictError:
+                    logging.error(
+                        "Deferred upload of %s conflicts with another writer, its content is kept in %s",
+                        file_name,
+                        _keep_dead_letter(file_name),
+                    )
+                except Exception:  # pylint: disable=broad-except
+                    logging.warning("Deferred upload of %s failed", file_name, exc_info=True)
+                    return False
+                del cls._pending_uploads[(bucket.bucket_name, file_name)]
+                if settings.upload_outbox:
+                    _write_outbox(cls._pending_uploads)
+        return True
+
+    @classmethod
+    def reset_uploads(cls):
+        """
+        Forget the deferred uploads and stop uploading them in the background, like a restart of the process. The
+        outbox is left in place, so its uploads are restored on the next use.
+        """
+        with cls._pending_lock:
+            drain_worker, drain_stopped = cls._drain_worker, cls._drain_stopped
+            S3AssetBucket._drain_worker = S3AssetBucket._drain_stopped = None
+        if drain_worker is not None:
+            drain_stopped.set()
+            cls._drain_requested.set()
+            drain_worker.join()
+
+        with cls._pending_lock:
+            if cls._flush_timer is not None:
+                cls._flush_timer.cancel()
+                S3AssetBucket._flush_timer = None
+            cls._pending_uploads.clear()
+            S3AssetBucket._pending_count = 0
+            cls._restored_outboxes.clear()
+            cls._drain_requested.clear()
+
+    @classmethod
+    def _request_drain(cls):
+        """Wake up the worker that uploads the outbox, starting it on first use"""
+        with cls._pending_lock:
+            if cls._drain_worker is None:
+                S3AssetBucket._drain_stopped = threading.Event()
+                S3AssetBucket._drain_worker = threading.Thread(
+                    target=cls._drain_outbox, args=(cls._drain_stopped,), name="outbox", daemon=True
+                )
+                cls._drain_worker.start()
+        cls._drain_requested.set()
+
+    @classmethod
+    def _drain_outbox(cls, stopped: threading.Event):
+        """Upload the outbox whenever uploads are deferred, retrying failed uploads with an increasing delay"""
+        retry_delay = None
+        while True:
+            cls._drain_requested.wait(timeout=retry_delay)
+            if stopped.is_set():
+                return
+            cls._drain_requested.clear()
+            try:
+                drained = cls.flush_uploads()
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Uploading the outbox failed")
+                drained = False
+
+            if drained:
+                retry_delay = None
+            else:
+                settings = get_repo_settings()
+                retry_delay = min(retry_delay * 2, _MAX_RETRY_DELAY) if retry_delay else settings.upload_retry_delay
+
+    def _restore_outbox(self):
+        """Defer the uploads that were left in the outbox by a previous process, once per outbox"""
+        settings = get_repo_settings()
+        if settings.local_assets_dir in self._restored_outboxes:
+            return
+
+        with self._pending_lock:
+            self._restored_outboxes.add(settings.local_assets_dir)
+            for bucket_name, file_name, conditional, expected_etag in _read_outbox():
+                pending_upload = _PendingUpload(S3AssetBucket(bucket_name), conditional, expected_etag)
+                self._pending_uploads.setdefault((bucket_name, file_name), pending_upload)
+        if self._pending_uploads:
+            self._request_drain()
+
+    def _upload_now(
+        self, file_name: str, conditional: bool, expected_etag: Optional[str], body: Optional[bytes] = None
+    ):
+        settings = get_repo_settings()
+        s3_path = f"{settings.s3_assets_dir}/{file_name}"
+
+        request = {"Bucket": self.bucket_name, "Key": s3_path}
+        if conditional and expected_etag:
+            request["IfMatch"] = expected_etag
+        elif conditional:
+            request["IfNoneMatch"] = "*"
+
+        # pylint: disable=import-outside-toplevel
+        from botocore.exceptions import ClientError
+
+        with timed("s3_upload"):
+            try:
+                if body is None:
+                    body = (settings.local_assets_dir / file_name).read_bytes()
+                response = self.s3_client.put_object(Body=body, **request)
+            except Exception as error:
+                # The local copy holds a write that was not stored, so the next download replaces it unconditionally
+                self._etags.pop((self.bucket_name, s3_path), None)
+                if isinstance(error, ClientError) and _is_conflict(error):
+                    raise WriteConflictError(f"{file_name} was changed by another writer") from error
+                raise
+
+        self._etags[(self.bucket_name, s3_path)] = response["ETag"]
+
+    def get_stored_etag(self, file_name: str) -> Optional[str]:
+        """Get the ETag of the stored asset without downloading it, or None when it does not exist"""
+        settings = get_repo_settings()
+        if not settings.s3_access:
+            return None
+
+        # pylint: disable=import-outside-toplevel
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=f"{settings.s3_assets_dir}/{file_name}")
+        except ClientError as error:
+            if _is_missing(error):
+                return None
+            raise
+        return response["ETag"]
+
+    def get_known_etags(self, file_names: Iterable[str]) -> dict[str, Optional[str]]:
+        """
+        Get the ETags of the stored assets that the local copies were last synced with, or None for the assets that
+        did not exist. Assets that were not synced yet are left out.
+        """
+        settings = get_repo_settings()
+        known_etags = {}
+        for file_name in file_names:
+            key = (self.bucket_name, f"{settings.s3_assets_dir}/{file_name}")
+            if key in self._etags:
+                known_etags[file_name] = self._etags[key]
+        return known_etags
+
+    def forget_asset_etags(self, file_names: Iterable[str]):
+        """Forget the ETags of assets, so their next downloads are unconditional"""
+        settings = get_repo_settings()
+        for file_name in file_names:
+            self._etags.pop((self.bucket_name, f"{settings.s3_assets_dir}/{file_name}"), None)
+
+    @classmethod
+    def forget_etags(cls):
+        """Forget all seen ETags, so the next downloads are unconditional"""
+        cls._etags.clear()
+
+
+# Headers of the parameters of conditional writes
+_WRITE_CONDITION_HEADERS = {"IfMatch": "If-Match", "IfNoneMatch": "If-None-Match"}
+
+
+# Longest delay before uploading the outbox again after a failure, in seconds
+_MAX_RETRY_DELAY = 60.0
+
+_OUTBOX_FILE_NAME = ".outbox.json"
+# Directory in the local assets directory with the content of the deferred uploads that conflicted with other writers
+_DEAD_LETTERS_DIR_NAME = ".dead_letters"
+
+
+def _keep_dead_letter(file_name: str) -> Path:
+    """Copy a local file of which the upload conflicted with another writer, returning the path of the copy"""
+    settings = get_repo_settings()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    dead_letter = settings.local_assets_dir / _DEAD_LETTERS_DIR_NAME / timestamp / file_name
+    write_file_atomically(dead_letter, (settings.local_assets_dir / file_name).read_bytes())
+    return dead_letter
+
+
+def _read_outbox() -> list[tuple[str, str, bool, Optional[str]]]:
+    outbox_file = get_repo_settings().local_assets_dir / _OUTBOX_FILE_NAME
+    if not outbox_file.exists():
+        return []
+    return [tuple(upload) for upload in json.loads(outbox_file.read_text(encoding="utf-8"))]
+
+
+def _write_outbox(pending_uploads: dict[tuple[str, str], _PendingUpload]):
+    uploads = [
+        (bucket_name, file_name, upload.conditional, upload.expected_etag)
+        for (bucket_name, file_name), upload in pending_uploads.items()
+    ]
+    write_file_atomically(get_repo_settings().local_assets_dir / _OUTBOX_FILE_NAME, json.dumps(uploads))
+
+
+def _support_conditional_writes(client: "BaseClient"):
+    """
+    Let PutObject send the IfMatch and IfNoneMatch parameters as headers, when the installed botocore does not know
+    these parameters yet
+    """
+    members = client.meta.service_model.operation_model("PutObject").input_shape.members
+    if "IfMatch" in members and "IfNoneMatch" in members:
+        return
+    client.meta.events.register("before-parameter-build.s3.PutObject", _pop_write_conditions)
+    client.meta.events.register("before-call.s3.PutObject", _add_write_condition_headers)
+
+
+def _pop_write_conditions(params: dict, context: dict, **_kwargs):
+    # Taken out before the parameters are validated, which would reject unknown parameters
+    context["write_conditions"] = {
+        header: params.pop(name) for name, header in _WRITE_CONDITION_HEADERS.items() if name in params
+    }
+
+
+def _add_write_condition_headers(params: dict, context: dict, **_kwargs):
+    params["headers"].update(context.get("write_conditions", {}))
+
+
+def _is_not_modified(error: "ClientError") -> bool:
+    """Check if a conditional request failed because the object did not change"""
+    status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return status_code == 304 or error.response.get("Error", {}).get("Code") in ("304", "NotModified")
+
+
+def _is_missing(error: "ClientError") -> bool:
+    """Check if a request failed because the object does not exist"""
+    return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey")
+
+
+def _is_conflict(error: "ClientError") -> bool:
+    """Check if a conditional write failed because another writer changed the object"""
+    status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    error_code = error.response.get("Error", {}).get("Code")
+    return status_code in (409, 412) or error_code in ("PreconditionFailed", "ConditionalRequestConflict", "412")
@@ -1,11 +1,12 @@
 """API settings."""
 import os
 from enum import Enum
-from functools import lru_cache
 from typing import Any
 
 from pydantic import BaseSettings, SecretStr
 
+from app.settings.provider import SettingsProvider
+
 
 class HttpMethod(Enum):
     """HTTP methods."""
@@ -32,6 +33,7 @@ class ApiSettings(BaseSettings):
     api_key_read_access: SecretStr = SecretStr("")
     api_key_write_access: SecretStr = SecretStr("")
     hide_spoilers: bool = False
+    response_cache_size: int = 256
 
     http_allowed_methods: list[str] = []
     http_allowed_headers: list[str] = []
@@ -60,25 +62,24 @@ class ApiSettings(BaseSettings):
             return cls.json_loads(raw_val)
 
 
-def get_api_settings():
+def get_api_settings() -> ApiSettings:
     """Get API settings."""
-    if os.getenv("USE_LAMBDA_DEV_SETTINGS"):
-        return _get_lambda_dev_settings()
-    if os.getenv("USE_LRU_CACHED_SETTINGS"):
-        return _get_cached_settings()
-    return ApiSettings()
+    return api_settings_provider.get()
 
 
-@lru_cache
-def _get_cached_settings():
+def _create_api_settings() -> ApiSettings:
+    if os.getenv("USE_LAMBDA_DEV_SETTINGS"):
+        return ApiSettings(
+            project_name="My AWS Lambda API",
+            http_allowed_methods=["*"],
+            http_allowed_headers=["*"],
+            http_allowed_origins=["*"],
+        )
     return ApiSettings()
 
 
-@lru_cache
-def _get_lambda_dev_settings():
-    return ApiSettings(
-        project_name="My AWS Lambda API",
-        http_allowed_methods=["*"],
-        http_allowed_headers=["*"],
-        http_allowed_origins=["*"],
-    )
+api_settings_provider = SettingsProvider(
+    ApiSettings,
+    factory=_create_api_settings,
+    extra_env_names=("use_lambda_dev_settings",),
+)
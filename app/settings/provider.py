@@ -0,0 +1,73 @@
+"""Settings provider."""
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Generic, Optional, Type, TypeVar
+
+from pydantic import BaseSettings
+
+SettingsT = TypeVar("SettingsT", bound=BaseSettings)
+
+
+class SettingsProvider(Generic[SettingsT]):
+    """
+    Provides a snapshot of settings, instead of reading the environment and .env file on every call.
+
+    The snapshot is read again on reload(), or when one of the environment variables of the settings or
+    the modification time of the .env file changes.
+    """
+
+    def __init__(
+        self,
+        settings_class: Type[SettingsT],
+        factory: Optional[Callable[[], SettingsT]] = None,
+        extra_env_names: tuple[str, ...] = (),
+    ):
+        self._factory = factory or settings_class
+        self._env_file = settings_class.__config__.env_file
+
+        env_names = set(extra_env_names)
+        for field in settings_class.__fields__.values():
+            env_names.update(field.field_info.extra.get("env_names", ()))
+        # Environment variables are case-insensitive for the settings, so watch the common spellings
+        self._env_names = tuple(sorted({name.lower() for name in env_names} | {name.upper() for name in env_names}))
+
+        self._lock = threading.Lock()
+        self._snapshot: Optional[SettingsT] = None
+        self._source_key: Optional[tuple] = None
+        self._override: Optional[SettingsT] = None
+
+    def get(self) -> SettingsT:
+        """Get the settings"""
+        if self._override is not None:
+            return self._override
+
+        snapshot = self._snapshot
+        if snapshot is None or self._get_source_key() != self._source_key:
+            snapshot = self.reload()
+        return snapshot
+
+    def reload(self) -> SettingsT:
+        """Read the settings again"""
+        with self._lock:
+            self._source_key = self._get_source_key()
+            self._snapshot = self._factory()
+            return self._snapshot
+
+    @contextmanager
+    def override(self, **values):
+        """Provide a copy of the settings with the given values, for example in tests"""
+        previous_override = self._override
+        self._override = self.get().copy(update=values)
+        try:
+            yield self._override
+        finally:
+            self._override = previous_override
+
+    def _get_source_key(self) -> tuple:
+        env_values = tuple(os.environ.get(name) for name in self._env_names)
+        try:
+            env_file_modified = os.stat(self._env_file).st_mtime_ns if self._env_file else None
+        except FileNotFoundError:
+            env_file_modified = None
+        return env_values, env_file_modified
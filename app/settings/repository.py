@@ -1,13 +1,23 @@
 """Repository settings."""
 import os
-from functools import lru_cache
+from enum import Enum
 from pathlib import PosixPath
 
 from pydantic import BaseSettings
 
+from app.settings.provider import SettingsProvider
 from app.utils import BASE_DIR
 
 
+class StorageMode(str, Enum):
+    """How repositories persist their changes."""
+
+    SNAPSHOT = "snapshot"
+    JOURNAL = "journal"
+    SQLITE = "sqlite"
+    SHARDED = "sharded"
+
+
 class RepositorySettings(BaseSettings):
     """Repository settings."""
 
@@ -21,6 +31,18 @@ class RepositorySettings(BaseSettings):
     s3_assets_dir: str = "assets"
     s3_access: bool = False
     s3_bucket_name: str = ""
+    s3_max_pool_connections: int = 10
+    io_max_threads: int = 10
+    repository_cache: bool = True
+    storage_mode: StorageMode = StorageMode.SNAPSHOT
+    journal_compaction_threshold: int = 100
+    sqlite_file_name: str = "futsta.sqlite3"
+    trusted_load: bool = True
+    write_conflict_retries: int = 3
+    write_behind_window: float = 0.0
+    write_behind_max_writes: int = 20
+    upload_outbox: bool = False
+    upload_retry_delay: float = 1.0
 
     # pylint: disable=too-few-public-methods
     class Config:
@@ -31,25 +53,22 @@ class RepositorySettings(BaseSettings):
         env_file_encoding = "utf-8"
 
 
-def get_repo_settings():
-    """Get API settings."""
-    if os.getenv("USE_LAMBDA_DEV_SETTINGS"):
-        return _get_lambda_dev_settings()
+def get_repo_settings() -> RepositorySettings:
+    """Get repository settings."""
+    return repo_settings_provider.get()
 
-    if os.getenv("USE_LRU_CACHED_SETTINGS"):
-        return _get_cached_settings()
 
+def _create_repo_settings() -> RepositorySettings:
+    if os.getenv("USE_LAMBDA_DEV_SETTINGS"):
+        return RepositorySettings(
+            local_access=True,
+            s3_access=True,
+        )
     return RepositorySettings()
 
 
-@lru_cache()
-def _get_lambda_dev_settings():
-    return RepositorySettings(
-        local_access=True,
-        s3_access=True,
-    )
-
-
-@lru_cache
-def _get_cached_settings():
-    return RepositorySettings()
+repo_settings_provider = SettingsProvider(
+    RepositorySettings,
+    factory=_create_repo_settings,
+    extra_env_names=("use_lambda_dev_settings",),
+)
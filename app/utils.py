@@ -1,7 +1,14 @@
 """
 Utility functions.
 """
+import os
+import tempfile
+from bisect import bisect_left, bisect_right
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence, TypeVar, Union
+
+ItemT = TypeVar("ItemT")
 
 BASE_DIR = Path(__file__).parent.parent
 
@@ -13,3 +20,29 @@ def int_to_ordinal(number: int) -> str:
     else:
         suffix = {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
     return f"{number}{suffix}"
+
+
+def iter_between_reversed(
+    sorted_items: Sequence[ItemT],
+    start: Optional[ItemT] = None,
+    end: Optional[ItemT] = None,
+) -> Iterator[ItemT]:
+    """Iterate from last to first over the items of a sorted sequence between start and end (inclusive)."""
+    low = 0 if start is None else bisect_left(sorted_items, start)
+    high = len(sorted_items) if end is None else bisect_right(sorted_items, end)
+    return (sorted_items[index] for index in range(high - 1, low - 1, -1))
+
+
+def paginate(items: Iterable[ItemT], offset: int = 0, limit: Optional[int] = None) -> list[ItemT]:
+    """Return the page of items after skipping offset items, with at most limit items."""
+    stop = None if limit is None else offset + limit
+    return list(islice(items, offset, stop))
+
+
+def write_file_atomically(path: Path, content: Union[str, bytes]):
+    """Replace a file at once, so concurrent readers and writers never see it half-written, not even after a crash."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    mode, encoding = ("wb", None) if isinstance(content, bytes) else ("w", "utf-8")
+    with tempfile.NamedTemporaryFile(mode, dir=path.parent, delete=False, encoding=encoding) as outfile:
+        outfile.write(content)
+    os.replace(outfile.name, path)
@@ -0,0 +1,56 @@
+"""In-memory stand-in for the S3 client, so benchmarks measure the API instead of the network."""
+import hashlib
+import io
+import threading
+
+from botocore.exceptions import ClientError
+
+
+class FakeS3Client:
+    """Keeps objects in memory and supports the S3 client calls made by S3AssetBucket"""
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.calls: dict[str, int] = {"get_object": 0, "put_object": 0}
+        self._lock = threading.Lock()
+
+    def get_object(self, Bucket: str, Key: str, IfNoneMatch: str = None):  # pylint: disable=invalid-name
+        """Get an object, failing like S3 when it is missing or did not change"""
+        with self._lock:
+            self.calls["get_object"] += 1
+            content = self.objects.get((Bucket, Key))
+
+        if content is None:
+            raise _client_error("NoSuchKey", 404, "GetObject")
+        etag = _etag(content)
+        if IfNoneMatch == etag:
+            raise _client_error("304", 304, "GetObject")
+        return {"Body": io.BytesIO(content), "ETag": etag}
+
+    def head_object(self, Bucket: str, Key: str):  # pylint: disable=invalid-name
+        """Get the metadata of an object, failing like S3 when it is missing"""
+        with self._lock:
+            content = self.objects.get((Bucket, Key))
+        if content is None:
+            raise _client_error("404", 404, "HeadObject")
+        return {"ETag": _etag(content)}
+
+    # pylint: disable=invalid-name,too-many-arguments
+    def put_object(self, Bucket: str, Key: str, Body, IfMatch: str = None, IfNoneMatch: str = None):
+        """Store an object, failing like S3 when a condition on the stored object does not hold"""
+        content = Body if isinstance(Body, bytes) else Body.read()
+        with self._lock:
+            self.calls["put_object"] += 1
+            stored = self.objects.get((Bucket, Key))
+            if (IfMatch and (stored is None or _etag(stored) != IfMatch)) or (IfNoneMatch and stored is not None):
+                raise _client_error("PreconditionFailed", 412, "PutObject")
+            self.objects[(Bucket, Key)] = content
+        return {"ETag": _etag(content)}
+
+
+def _etag(content: bytes) -> str:
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def _client_error(code: str, status_code: int, operation_name: str) -> ClientError:
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status_code}}, operation_name)
@@ -0,0 +1,71 @@
+"""
+Benchmark of the import time of the API, which makes up most of its cold start on AWS Lambda.
+
+Run from the root of the project:
+    python -m benchmarks.import_time [--runs 5] [--max-ms 1000]
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from statistics import median
+
+from app.utils import BASE_DIR
+
+# Dependencies that should only be imported once they are used
+LAZY_MODULES = ("boto3", "botocore", "uvicorn")
+
+_IMPORT_TIME_PATTERN = re.compile(r"import time:\s+\d+ \|\s+(?P<cumulative>\d+) \|\s+(?P<module>\S+)")
+
+
+def measure_import_time(module: str) -> dict[str, int]:
+    """Import a module in a fresh interpreter, returning the cumulative import time of every module in microseconds"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        cwd=BASE_DIR,
+        text=True,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if match := _IMPORT_TIME_PATTERN.match(line):
+            import_times[match["module"]] = int(match["cumulative"])
+    return import_times
+
+
+def main():
+    """Measure the import time of the API and print the results as json"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="module to import")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to measure")
+    parser.add_argument("--max-ms", type=float, help="fail when the median import time exceeds this")
+    args = parser.parse_args()
+
+    runs = [measure_import_time(args.module) for _ in range(args.runs)]
+    median_times = {module: median(run.get(module, 0) for run in runs) for module in runs[0]}
+    import_time_ms = median_times[args.module] / 1000
+    lazy_modules_imported = [module for module in LAZY_MODULES if module in runs[0]]
+
+    top_level_modules = {module: time for module, time in median_times.items() if "." not in module}
+    heaviest = sorted(top_level_modules.items(), key=lambda item: item[1], reverse=True)[:10]
+    print(
+        json.dumps(
+            {
+                "module": args.module,
+                "runs": args.runs,
+                "import_time_ms": import_time_ms,
+                "heaviest_modules_ms": {module: time / 1000 for module, time in heaviest},
+                "lazy_modules_imported": lazy_modules_imported,
+            },
+            indent=4,
+        )
+    )
+
+    if lazy_modules_imported or (args.max_ms is not None and import_time_ms > args.max_ms):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
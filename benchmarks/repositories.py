@@ -0,0 +1,202 @@
+"""
+Benchmark of the repositories and the API on a synthetic dataset of several seasons.
+
+The assets are stored in a temporary directory and in an in-memory stand-in for S3, so the results do not depend on
+the network. Run from the root of the project:
+    python -m benchmarks.repositories [--players 50] [--matches 2000] [--goals 50000] [--runs 5] [--output results.json]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from statistics import median
+from typing import Callable, Optional
+from unittest.mock import patch
+
+from app.models.goals import CountType, Goal, Score
+from app.models.matches import Match
+from app.models.opponents import Opponent
+from app.models.players import Player
+from app.repositories.base.repo import JsonRepository
+from app.repositories.base.session import RepositorySession
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.goals.validators import (
+    validate_involved_players,
+    validate_is_last_goal,
+    validate_score,
+    validate_subsequent_goal,
+)
+from app.repositories.matches.repo import MatchRepository
+from app.repositories.opponents import OpponentRepository
+from app.repositories.player_counts import PlayerCountRepository
+from app.repositories.players import PlayerRepository
+from app.repositories.stats import StatRepository
+from app.s3 import S3AssetBucket
+from benchmarks.fake_s3 import FakeS3Client
+
+_API_KEY = "benchmark"
+_FIRST_MATCH_DATE = date(2000, 1, 1)
+
+
+def generate_dataset(players: int, matches: int, goals: int, seed: int = 0):  # pylint: disable=too-many-locals
+    """Save a synthetic dataset to the repositories, with consistent scores"""
+    rng = random.Random(seed)
+
+    player_assets = [Player(name=f"Player {index}") for index in range(players)]
+    opponent_assets = [Opponent(name=f"Opponent {index}") for index in range(max(1, matches // 100))]
+    match_assets = [
+        Match(
+            match_date=_FIRST_MATCH_DATE + timedelta(days=3 * index),
+            opponent=rng.choice(opponent_assets),
+            is_home=rng.random() < 0.5,
+        )
+        for index in range(matches)
+    ]
+
+    goals_per_match = [0] * matches
+    for _ in range(goals):
+        goals_per_match[rng.randrange(matches)] += 1
+
+    goal_assets = []
+    for match, match_goals in zip(match_assets, goals_per_match):
+        home, away = 0, 0
+        for _ in range(match_goals):
+            is_team_goal = rng.random() < 0.6
+            if is_team_goal == match.is_home:
+                home += 1
+            else:
+                away += 1
+            scored_by, assisted_by = rng.sample(player_assets, 2) if is_team_goal else (None, None)
+            if assisted_by and rng.random() < 0.3:
+                assisted_by = None
+            goal_assets.append(
+                Goal(
+                    match_date=match.match_date,
+                    scored_by=scored_by,
+                    assisted_by=assisted_by,
+                    score=Score(home=home, away=away),
+                )
+            )
+
+    PlayerRepository(assets=player_assets).save()
+    OpponentRepository(assets=opponent_assets).save()
+    MatchRepository(assets=match_assets).save()
+    goal_repo = GoalRepository(assets=goal_assets)
+    goal_repo.save()
+    PlayerCountRepository.from_goals(goal_repo).save()
+
+
+def measure(
+    func: Callable[[], object],
+    runs: int,
+    setup: Optional[Callable[[], object]] = None,
+    teardown: Optional[Callable[[], object]] = None,
+) -> dict[str, float]:
+    """Time a function over a number of runs, leaving setup and teardown out of the timings"""
+    durations = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+        if teardown:
+            teardown()
+    return {"median_ms": median(durations), "min_ms": min(durations), "max_ms": max(durations)}
+
+
+def run_benchmarks(runs: int) -> dict[str, dict[str, float]]:  # pylint: disable=too-many-locals
+    """Measure the repositories and the API on the dataset that is stored in the repositories"""
+    # pylint: disable=import-outside-toplevel
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    def _forget_loaded_assets():
+        JsonRepository.clear_cache()
+        S3AssetBucket.forget_etags()
+
+    results = {}
+    for repo_class in (GoalRepository, MatchRepository, PlayerRepository, OpponentRepository):
+        name = repo_class.Config.json_file_name.removesuffix(".json")
+        results[f"{name}.load"] = measure(repo_class.load, runs, setup=_forget_loaded_assets)
+        results[f"{name}.load_cached"] = measure(repo_class.load, runs)
+
+    goal_repo = GoalRepository.load()
+    last_match = MatchRepository.load().get_page(limit=1)[0]
+    player = PlayerRepository.load().assets[0]
+    goal = Goal(match_date=last_match.match_date, scored_by=player)
+    goal.score = goal_repo.get_next_score(goal, last_match)
+    add_validators = {validate_involved_players, validate_subsequent_goal, validate_score}
+
+    def _add_goal():
+        goal_repo.add(goal, validators=add_validators, session=RepositorySession())
+
+    def _remove_goal():
+        goal_repo.remove(goal, validators={validate_is_last_goal}, session=RepositorySession())
+
+    results["goals.add"] = measure(_add_goal, runs, teardown=_remove_goal)
+    results["goals.remove"] = measure(_remove_goal, runs, setup=_add_goal)
+    results["goals.save"] = measure(goal_repo.save, runs)
+    results["stats.from_goals"] = measure(lambda: StatRepository.from_goals(CountType.GOAL), runs)
+
+    client = TestClient(app)
+    headers = {"ApiKey": _API_KEY}
+    goal_json = {"match_date": last_match.match_date.isoformat(), "scored_by": player.name}
+
+    def _post_goal():
+        response = client.post("goals", json=goal_json, headers=headers)
+        assert response.status_code == 201, response.text
+
+    def _delete_goal():
+        posted_goal = GoalRepository.load().get_last_goal(last_match.match_date)
+        response = client.request("DELETE", "goals", content=posted_goal.json(), headers=headers)
+        assert response.status_code == 200, response.text
+
+    results["api.post_goal"] = measure(_post_goal, runs, teardown=_delete_goal)
+    return results
+
+
+def main():
+    """Generate a dataset, run the benchmarks and print the results as json"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=50, help="number of players in the dataset")
+    parser.add_argument("--matches", type=int, default=2000, help="number of matches in the dataset")
+    parser.add_argument("--goals", type=int, default=50000, help="number of goals in the dataset")
+    parser.add_argument("--runs", type=int, default=5, help="number of times each benchmark is run")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random dataset")
+    parser.add_argument("--output", help="file to write the results to, instead of printing them")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as assets_dir:
+        environ = {
+            "LOCAL_ACCESS": "True",
+            "LOCAL_ASSETS_DIR": assets_dir,
+            "S3_ACCESS": "True",
+            "S3_BUCKET_NAME": "benchmark",
+            "API_KEY_WRITE_ACCESS": _API_KEY,
+        }
+        with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", FakeS3Client()):
+            generate_dataset(args.players, args.matches, args.goals, args.seed)
+            results = run_benchmarks(args.runs)
+
+    output = json.dumps(
+        {
+            "dataset": {"players": args.players, "matches": args.matches, "goals": args.goals, "seed": args.seed},
+            "runs": args.runs,
+            "results": results,
+        },
+        indent=4,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as outfile:
+            outfile.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,24 @@ import pytest
 from app.models.goals import Goal, Score
 from app.models.matches import Match
 from app.models.opponents import Opponent
+from app.repositories.base.repo import JsonRepository
 from app.repositories.goals.repo import GoalRepository
+from app.routers._helpers import clear_response_cache
+from app.s3 import S3AssetBucket
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """Make sure no repository state leaks between tests"""
+    JsonRepository.clear_cache()
+    S3AssetBucket.forget_etags()
+    S3AssetBucket.reset_uploads()
+    clear_response_cache()
+    yield
+    JsonRepository.clear_cache()
+    S3AssetBucket.forget_etags()
+    S3AssetBucket.reset_uploads()
+    clear_response_cache()
 
 
 @pytest.fixture(name="home_goal")
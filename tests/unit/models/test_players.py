@@ -19,7 +19,8 @@ def test_create_player_from_integer():
 def test_player_hashing():
     name = "TestPlayer"
     player = Player(name=name)
-    assert hash(player) == hash(name)
+    assert hash(player) == hash(Player(name=name.lower()))
+    assert {player, Player(name=name.upper())} == {player}
 
 
 def test_player_equality():
@@ -0,0 +1,32 @@
+"""Test building models without validating them."""
+# pylint: disable=missing-function-docstring
+import json
+from datetime import date
+
+import pytest
+
+from app.models.goals import Goal, Score
+from app.models.players import Player
+from app.repositories.base.hydration import HydrationError, construct_trusted
+from app.repositories.goals.repo import GoalRepository
+
+
+def test_construct_trusted_matches_validation(home_goal, away_goal):
+    data = json.loads(GoalRepository(assets=[home_goal, away_goal], version=2).json())
+
+    repo = construct_trusted(GoalRepository, data)
+
+    assert repo == GoalRepository(**data)
+    assert isinstance(repo.assets[0].scored_by, Player)
+    assert isinstance(repo.assets[0].score, Score)
+    assert isinstance(repo.assets[0].match_date, date)
+
+
+def test_construct_trusted_validates_unexpected_values():
+    goal = construct_trusted(Goal, {"match_date": "2023-04-17", "scored_by": "Thijs", "score": "1-0"})
+
+    assert goal.scored_by == Player(name="Thijs")
+    assert goal.score == Score(home=1, away=0)
+
+    with pytest.raises(HydrationError):
+        construct_trusted(Goal, {"match_date": "not a date"})
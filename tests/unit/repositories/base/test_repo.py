@@ -1,12 +1,19 @@
 """Test the base repository class."""
 import os
+import sqlite3
 from unittest.mock import patch
 
 import pytest
+from botocore.exceptions import ClientError
 from pydantic import BaseModel
 
-from app.exceptions import NotFoundError
-from app.repositories.base.repo import JsonRepository
+from app.exceptions import AlreadyExistsError, NotFoundError, WriteConflictError
+from app.repositories.base.hydration import construct_trusted
+from app.repositories.base.repo import _REPOSITORY_CACHE, JsonRepository
+from app.repositories.base.storage import SnapshotStorage
+from app.repositories.base.validators import assert_not_in
+from app.s3 import S3AssetBucket
+from benchmarks.fake_s3 import FakeS3Client
 
 
 class _MyAsset(BaseModel):
@@ -53,3 +60,219 @@ def test_remove_non_existing_asset():
 
     with pytest.raises(NotFoundError):
         repo.remove(my_asset)
+
+
+def test_load_from_cache(tmp_path):
+    """Test that an unchanged json file is only parsed once."""
+    repo = _MyJsonRepo()
+    repo.assets = [_MyAsset(name="test")]
+
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        repo.save()
+        with patch.object(SnapshotStorage, "_read_json_data") as read_json_data:
+            first = _MyJsonRepo.load()
+            second = _MyJsonRepo.load()
+
+    assert read_json_data.call_count == 0
+    assert first.assets == second.assets == [_MyAsset(name="test")]
+    assert first.assets is not second.assets
+
+
+def test_load_cache_invalidated_by_file_change(tmp_path):
+    """Test that a changed json file is parsed again."""
+    repo = _MyJsonRepo()
+    repo.assets = [_MyAsset(name="test")]
+
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        repo.save()
+        (tmp_path / "test.json").write_text('{"assets": [{"name": "changed"}, {"name": "externally"}]}')
+        repo = _MyJsonRepo.load()
+
+    assert repo.assets == [_MyAsset(name="changed"), _MyAsset(name="externally")]
+
+
+def test_journal_storage_mode(tmp_path):
+    """Test that changes are appended to the journal until it is compacted."""
+    repo = _MyJsonRepo()
+    environ = {
+        "LOCAL_ACCESS": "true",
+        "local_assets_dir": str(tmp_path),
+        "STORAGE_MODE": "journal",
+        "JOURNAL_COMPACTION_THRESHOLD": "3",
+    }
+
+    with patch.dict(os.environ, environ):
+        repo.add(_MyAsset(name="first"))
+        repo.add(_MyAsset(name="second"))
+        repo.remove(_MyAsset(name="first"))
+        assert not (tmp_path / "test.json").exists()
+        assert len((tmp_path / "test.journal.jsonl").read_text().splitlines()) == 3
+
+        _MyJsonRepo.clear_cache()
+        repo = _MyJsonRepo.load()
+        assert repo.assets == [_MyAsset(name="second")]
+
+        repo.add(_MyAsset(name="third"))
+        assert (tmp_path / "test.json").exists()
+        assert not (tmp_path / "test.journal.jsonl").read_text()
+
+        _MyJsonRepo.clear_cache()
+        repo = _MyJsonRepo.load()
+    assert repo.assets == [_MyAsset(name="second"), _MyAsset(name="third")]
+    assert repo.version == 4
+
+
+def test_journal_operations_in_json_file_are_skipped(tmp_path):
+    """Test that a journal which was not truncated after compaction does not apply operations twice."""
+    repo = _MyJsonRepo()
+
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path), "STORAGE_MODE": "journal"}):
+        repo.add(_MyAsset(name="first"))
+        journal = (tmp_path / "test.journal.jsonl").read_text()
+        repo.save()
+        (tmp_path / "test.journal.jsonl").write_text(journal)
+
+        _MyJsonRepo.clear_cache()
+        repo = _MyJsonRepo.load()
+    assert repo.assets == [_MyAsset(name="first")]
+
+
+def test_sqlite_storage_mode(tmp_path):
+    """Test that changes are written to the rows of the SQLite database."""
+    repo = _MyJsonRepo()
+
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path), "STORAGE_MODE": "sqlite"}):
+        repo.add(_MyAsset(name="first"))
+        repo.add(_MyAsset(name="second"))
+        repo.remove(_MyAsset(name="first"))
+        content_hash = _MyJsonRepo.get_content_hash()
+
+        _MyJsonRepo.clear_cache()
+        loaded = _MyJsonRepo.load()
+        assert loaded.assets == [_MyAsset(name="second")]
+        assert loaded.version == 3
+
+        loaded.add(_MyAsset(name="third"))
+        assert _MyJsonRepo.get_content_hash() != content_hash
+        assert _MyJsonRepo.load().assets == [_MyAsset(name="second"), _MyAsset(name="third")]
+
+    assert not (tmp_path / "test.json").exists()
+    with sqlite3.connect(tmp_path / "futsta.sqlite3") as connection:
+        rows = connection.execute('SELECT data FROM "test" ORDER BY id').fetchall()
+    assert rows == [('{"name": "second"}',), ('{"name": "third"}',)]
+
+
+def test_sqlite_storage_mode_removes_rows_by_id(tmp_path):
+    """Test that the row of a removed asset is deleted, also when its json differs from how the asset serializes"""
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path), "STORAGE_MODE": "sqlite"}):
+        _MyJsonRepo().add(_MyAsset(name="first"))
+        with sqlite3.connect(tmp_path / "futsta.sqlite3") as connection:
+            connection.execute('UPDATE "test" SET data = ?', ('{ "name": "first" }',))
+
+        _MyJsonRepo.clear_cache()
+        _MyJsonRepo.load().remove(_MyAsset(name="first"))
+        _MyJsonRepo.clear_cache()
+        assert not _MyJsonRepo.load().assets
+
+
+def test_trusted_load_requires_valid_checksum(tmp_path):
+    """Test that only json files with a valid checksum are loaded without validation."""
+    repo = _MyJsonRepo(assets=[_MyAsset(name="test")])
+
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        repo.save()
+        _MyJsonRepo.clear_cache()
+        with patch("app.repositories.base.storage.construct_trusted", wraps=construct_trusted) as trusted:
+            assert _MyJsonRepo.load().assets == [_MyAsset(name="test")]
+            assert trusted.call_count == 1
+
+            _MyJsonRepo.clear_cache()
+            json_file = tmp_path / "test.json"
+            json_file.write_text(json_file.read_text().replace('"test"', '"changed"'))
+            assert _MyJsonRepo.load().assets == [_MyAsset(name="changed")]
+            assert trusted.call_count == 1
+
+
+@pytest.mark.parametrize("storage_mode", ["snapshot", "journal", "sqlite"])
+def test_concurrent_writers(tmp_path, storage_mode):
+    """Test that a write that conflicts with another writer is applied again on top of the stored changes"""
+    environ = {
+        "STORAGE_MODE": storage_mode,
+        "LOCAL_ACCESS": "true",
+        "LOCAL_ASSETS_DIR": str(tmp_path),
+        "S3_ACCESS": "true",
+        "S3_BUCKET_NAME": "bucket",
+    }
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", FakeS3Client()):
+        first, second = _MyJsonRepo.load(), _MyJsonRepo.load()
+        first.add(_MyAsset(name="first"))
+        second.add(_MyAsset(name="second"))
+        assert second.assets == [_MyAsset(name="first"), _MyAsset(name="second")]
+
+        _MyJsonRepo.clear_cache()
+        S3AssetBucket.forget_etags()
+        for local_file in tmp_path.iterdir():
+            local_file.unlink()
+        assert _MyJsonRepo.load().assets == [_MyAsset(name="first"), _MyAsset(name="second")]
+
+
+def test_concurrent_writers_validated_again(tmp_path):
+    """Test that the changes are validated again after a write conflict, and that retries are limited"""
+    environ = {"LOCAL_ACCESS": "true", "LOCAL_ASSETS_DIR": str(tmp_path), "S3_ACCESS": "true", "S3_BUCKET_NAME": "b"}
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", FakeS3Client()):
+        first, second = _MyJsonRepo.load(), _MyJsonRepo.load()
+        first.add(_MyAsset(name="same"))
+        with pytest.raises(AlreadyExistsError):
+            second.add(_MyAsset(name="same"), validators={assert_not_in})
+
+        first, second = _MyJsonRepo.load(), _MyJsonRepo.load()
+        first.add(_MyAsset(name="first"))
+        with patch.dict(os.environ, {"WRITE_CONFLICT_RETRIES": "0"}), pytest.raises(WriteConflictError):
+            second.add(_MyAsset(name="second"))
+
+        _MyJsonRepo.clear_cache()
+        assert _MyJsonRepo.load().assets == [_MyAsset(name="same"), _MyAsset(name="first")]
+
+
+@pytest.mark.parametrize("storage_mode", ["snapshot", "journal", "sqlite"])
+def test_upload_what_was_written(tmp_path, storage_mode):
+    """Test that the written content is uploaded, even when another writer replaced the local files in the meantime"""
+    environ = {
+        "STORAGE_MODE": storage_mode,
+        "LOCAL_ACCESS": "true",
+        "LOCAL_ASSETS_DIR": str(tmp_path),
+        "S3_ACCESS": "true",
+        "S3_BUCKET_NAME": "bucket",
+    }
+    upload_asset = S3AssetBucket.upload_asset
+
+    def replace_local_file_and_upload(bucket, file_name, *args):
+        (tmp_path / file_name).write_bytes(b"written by another writer")
+        upload_asset(bucket, file_name, *args)
+
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", FakeS3Client()):
+        repo = _MyJsonRepo.load()
+        with patch.object(S3AssetBucket, "upload_asset", replace_local_file_and_upload):
+            repo.add(_MyAsset(name="written"))
+
+        _MyJsonRepo.clear_cache()
+        S3AssetBucket.forget_etags()
+        for local_file in tmp_path.rglob("*"):
+            if local_file.is_file():
+                local_file.unlink()
+        assert _MyJsonRepo.load().assets == [_MyAsset(name="written")]
+
+
+def test_failed_upload_not_cached(tmp_path):
+    """Test that a repository is only cached once its upload succeeded"""
+    environ = {"LOCAL_ACCESS": "true", "LOCAL_ASSETS_DIR": str(tmp_path), "S3_ACCESS": "true", "S3_BUCKET_NAME": "b"}
+    s3_client = FakeS3Client()
+    server_error = ClientError({"Error": {"Code": "500"}, "ResponseMetadata": {"HTTPStatusCode": 500}}, "PutObject")
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", s3_client):
+        repo = _MyJsonRepo.load()
+        repo.add(_MyAsset(name="stored"))
+        with patch.object(s3_client, "put_object", side_effect=server_error), pytest.raises(ClientError):
+            repo.add(_MyAsset(name="failed"))
+
+        assert _REPOSITORY_CACHE[_MyJsonRepo].repo.assets == [_MyAsset(name="stored")]
+        assert _MyJsonRepo.load().assets == [_MyAsset(name="stored")]
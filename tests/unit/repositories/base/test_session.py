@@ -0,0 +1,50 @@
+"""Unit tests for the repository session."""
+# pylint: disable=missing-function-docstring
+from datetime import datetime
+from unittest.mock import patch
+
+from app.models.goals import Goal
+from app.repositories.base.session import RepositorySession
+from app.repositories.goals.validators import validate_involved_players, validate_score
+from app.repositories.matches.repo import MatchRepository
+from app.repositories.players import PlayerRepository
+
+
+def test_session_loads_repository_once():
+    session = RepositorySession()
+
+    with patch.object(PlayerRepository, "load", return_value=PlayerRepository()) as load:
+        first = session.get(PlayerRepository)
+        second = session.get(PlayerRepository)
+
+    assert load.call_count == 1
+    assert first is second
+
+
+def test_session_hands_out_registered_repository():
+    session = RepositorySession()
+    player_repo = PlayerRepository()
+
+    session.register(player_repo)
+    with patch.object(PlayerRepository, "load") as load:
+        assert session.get(PlayerRepository) is player_repo
+    assert load.call_count == 0
+
+
+def test_validators_share_session(home_repo, home_match):
+    session = RepositorySession()
+    player_repo = PlayerRepository(assets=[{"name": "Thijs"}])
+    match_repo = MatchRepository(assets=[home_match])
+
+    with (
+        patch.object(PlayerRepository, "load", return_value=player_repo) as load_players,
+        patch.object(MatchRepository, "load", return_value=match_repo) as load_matches,
+    ):
+        for _ in range(2):
+            goal = Goal(match_date=datetime.now().date(), scored_by="Thijs")
+            goal.score = home_repo.get_next_score(goal, home_match)
+            home_repo.add(goal, validators={validate_involved_players, validate_score}, session=session)
+
+    assert len(home_repo.assets) == 3
+    assert load_players.call_count == 1
+    assert load_matches.call_count == 1
@@ -0,0 +1,233 @@
+"""Unit tests for the goal repository."""
+# pylint: disable=missing-function-docstring
+import os
+import shutil
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+
+from app.exceptions import ValidationError
+from app.models.goals import CountType, Goal, Score
+from app.models.matches import Match
+from app.models.players import Player
+from app.models.timelines import MatchResult
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.goals.validators import validate_subsequent_goal
+from app.s3 import S3AssetBucket
+from benchmarks.fake_s3 import FakeS3Client
+
+
+def _goal(match_date: date, home: int, away: int) -> Goal:
+    return Goal(match_date=match_date, scored_by=None, score=Score(home=home, away=away))
+
+
+def test_get_by_match_date_is_ordered():
+    repo = GoalRepository(assets=[_goal(date(2023, 4, 17), 2, 0), _goal(date(2023, 4, 17), 1, 0)])
+
+    assert [goal.order for goal in repo.get_by_match_date(date(2023, 4, 17))] == [1, 2]
+    assert not repo.get_by_match_date(date(2023, 4, 18))
+
+
+def test_index_follows_add_and_remove():
+    repo = GoalRepository()
+    first_goal = _goal(date(2023, 4, 17), 1, 0)
+    second_goal = _goal(date(2023, 4, 17), 1, 1)
+
+    repo.add(first_goal)
+    repo.add(second_goal)
+    assert repo.get_last_goal(date(2023, 4, 17)) is second_goal
+    assert repo.get_current_score(date(2023, 4, 17)) == Score(home=1, away=1)
+
+    repo.remove(second_goal)
+    repo.remove(first_goal)
+    assert repo.get_last_goal(date(2023, 4, 17)) is None
+    assert repo.get_current_score(date(2023, 4, 17)) == Score.construct(home=0, away=0)
+
+
+def test_index_rebuilt_on_assignment(home_repo, home_goal):
+    assert home_repo.get_by_match_date(date.today()) == [home_goal]
+
+    home_repo.assets = []
+    assert not home_repo.get_by_match_date(date.today())
+
+
+def test_cached_load_copies_indexes(tmp_path):
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "LOCAL_ASSETS_DIR": str(tmp_path)}):
+        GoalRepository(assets=[_goal(date(2023, 4, 17), 1, 0)]).save()
+        with patch.object(GoalRepository, "_intern_players") as intern_players:
+            first, second = GoalRepository.load(), GoalRepository.load()
+        second.add(_goal(date(2023, 4, 17), 2, 0))
+
+    assert intern_players.call_count == 0
+    assert first.get_current_score(date(2023, 4, 17)) == Score(home=1, away=0)
+    assert second.get_current_score(date(2023, 4, 17)) == Score(home=2, away=0)
+
+
+def test_goals_share_player_instances():
+    repo = GoalRepository(
+        assets=[
+            Goal(match_date=date(2023, 4, 17), scored_by="Thijs", assisted_by="Mark", score="1-0"),
+            Goal(match_date=date(2023, 4, 17), scored_by="Mark", assisted_by="Thijs", score="2-0"),
+        ]
+    )
+    repo.add(Goal(match_date=date(2023, 4, 17), scored_by="Thijs", score="3-0"))
+
+    first, second, third = repo.assets
+    assert first.scored_by is second.assisted_by is third.scored_by
+    assert first.assisted_by is second.scored_by
+    assert repo.get_player_counts(CountType.GOAL) == {Player(name="Thijs"): 2, Player(name="Mark"): 1}
+
+
+def test_goals_keep_the_spelling_of_their_players(tmp_path):
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "LOCAL_ASSETS_DIR": str(tmp_path)}):
+        repo = GoalRepository.load()
+        repo.add(Goal(match_date=date(2023, 4, 17), scored_by="thijs", score="1-0"))
+        repo.add(Goal(match_date=date(2023, 4, 17), scored_by="Thijs", score="2-0"))
+        GoalRepository.clear_cache()
+        repo = GoalRepository.load()
+
+    assert [goal.scored_by.name for goal in repo.assets] == ["thijs", "Thijs"]
+    assert repo.get_player_counts(CountType.GOAL) == {Player(name="Thijs"): 2}
+
+
+def test_timeline_follows_add_and_remove():
+    match = Match(match_date=date(2023, 4, 17), opponent="Opponent", is_home=False)
+    repo = GoalRepository(
+        assets=[
+            Goal(match_date=date(2023, 4, 17), scored_by="Mark", score="1-2"),
+            Goal(match_date=date(2023, 4, 17), scored_by="Thijs", assisted_by="Mark", score="0-1"),
+        ]
+    )
+    repo.add(Goal(match_date=date(2023, 4, 17), score="1-1"))
+
+    timeline = repo.get_timeline(match)
+    assert [str(goal.score) for goal in timeline.goals] == ["0-1", "1-1", "1-2"]
+    assert [(count.player.name, count.goals, count.assists) for count in timeline.player_counts] == [
+        ("Thijs", 1, 0),
+        ("Mark", 1, 1),
+    ]
+    assert (str(timeline.score), timeline.result) == ("1-2", MatchResult.WIN)
+
+    repo.remove(repo.get_last_goal(date(2023, 4, 17)))
+    assert (str(repo.get_timeline(match).score), repo.get_timeline(match).result) == ("1-1", MatchResult.DRAW)
+
+
+def test_timeline_without_goals():
+    timeline = GoalRepository().get_timeline(Match(match_date=date(2023, 4, 17), opponent="Opponent", is_home=True))
+
+    assert not timeline.goals
+    assert (str(timeline.score), timeline.result) == ("0-0", MatchResult.DRAW)
+
+
+def test_get_page_is_newest_first():
+    repo = GoalRepository(
+        assets=[
+            _goal(date(2023, 4, 17), 1, 0),
+            _goal(date(2023, 3, 3), 1, 0),
+            _goal(date(2023, 4, 17), 2, 0),
+            _goal(date(2023, 5, 1), 1, 0),
+        ]
+    )
+
+    page = repo.get_page()
+    assert [(goal.match_date, goal.order) for goal in page] == [
+        (date(2023, 5, 1), 1),
+        (date(2023, 4, 17), 2),
+        (date(2023, 4, 17), 1),
+        (date(2023, 3, 3), 1),
+    ]
+    assert repo.get_page(offset=1, limit=2) == page[1:3]
+    assert repo.get_page(start=date(2023, 4, 1), end=date(2023, 4, 30)) == page[1:3]
+
+    repo.remove(page[0])
+    assert repo.get_page(limit=1) == [page[1]]
+
+
+def test_sharded_storage_mode(tmp_path):
+    s3_client = FakeS3Client()
+    environ = {
+        "LOCAL_ACCESS": "true",
+        "LOCAL_ASSETS_DIR": str(tmp_path),
+        "S3_ACCESS": "true",
+        "S3_BUCKET_NAME": "bucket",
+        "STORAGE_MODE": "sharded",
+    }
+    first_match_goal = _goal(date(2023, 4, 17), 1, 0)
+    second_match_goal = _goal(date(2023, 4, 24), 1, 0)
+
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", s3_client):
+        repo = GoalRepository()
+        repo.add(first_match_goal)
+        repo.add(second_match_goal)
+        uploads = s3_client.calls["put_object"]
+        repo.add(_goal(date(2023, 4, 24), 1, 1))
+        assert s3_client.calls["put_object"] - uploads == 3  # the shard, the index and the player counts
+
+        shard_hash = GoalRepository.get_content_hash(shard_key="2023-04-17")
+        GoalRepository.clear_cache()
+        (tmp_path / "goals").rename(tmp_path / "downloaded")
+        assert [goal.order for goal in GoalRepository.load().get_by_match_date(date(2023, 4, 24))] == [1, 2]
+
+        shard = GoalRepository.load_shard("2023-04-17")
+        assert shard.assets == [first_match_goal]
+        shard.remove(first_match_goal)
+        assert not (tmp_path / "goals" / "2023-04-17.json").exists()
+        assert GoalRepository.get_content_hash(shard_key="2023-04-24") is not None
+        assert GoalRepository.get_content_hash(shard_key="2023-04-17") != shard_hash
+
+        repo = GoalRepository.load()
+    assert not (tmp_path / "goals.json").exists()
+    assert len(repo.assets) == 2
+    assert repo.version == 4
+
+
+def test_sharded_storage_mode_adds_to_removed_shard(tmp_path):
+    environ = {
+        "LOCAL_ACCESS": "true",
+        "LOCAL_ASSETS_DIR": str(tmp_path),
+        "S3_ACCESS": "true",
+        "S3_BUCKET_NAME": "bucket",
+        "STORAGE_MODE": "sharded",
+    }
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", FakeS3Client()):
+        repo = GoalRepository.load()
+        repo.add(_goal(date(2024, 1, 1), 1, 0))
+        repo.remove(_goal(date(2024, 1, 1), 1, 0))
+        repo = GoalRepository.load()
+        repo.add(_goal(date(2024, 1, 1), 0, 1))
+
+        GoalRepository.clear_cache()
+        S3AssetBucket.forget_etags()
+        shutil.rmtree(tmp_path / "goals")
+        repo = GoalRepository.load()
+    assert repo.get_by_match_date(date(2024, 1, 1)) == [_goal(date(2024, 1, 1), 0, 1)]
+
+
+def test_sharded_concurrent_writers(tmp_path):
+    environ = {
+        "LOCAL_ACCESS": "true",
+        "LOCAL_ASSETS_DIR": str(tmp_path),
+        "S3_ACCESS": "true",
+        "S3_BUCKET_NAME": "bucket",
+        "STORAGE_MODE": "sharded",
+    }
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", FakeS3Client()):
+        first, second = GoalRepository.load(), GoalRepository.load_shard("2023-04-24")
+        first.add(_goal(date(2023, 4, 17), 1, 0))
+        second.add(_goal(date(2023, 4, 24), 1, 0))  # only the index conflicts, so it is merged
+
+        first, second = GoalRepository.load_shard("2023-04-24"), GoalRepository.load()
+        first.add(_goal(date(2023, 4, 24), 1, 1))
+        with pytest.raises(ValidationError):
+            second.add(Goal(match_date=date(2023, 4, 24), score="2-0"), validators={validate_subsequent_goal})
+        second.add(_goal(date(2023, 4, 24), 2, 1), validators={validate_subsequent_goal})
+
+        GoalRepository.clear_cache()
+        repo = GoalRepository.load()
+    assert [(goal.match_date, goal.order) for goal in repo.get_page()] == [
+        (date(2023, 4, 24), 3),
+        (date(2023, 4, 24), 2),
+        (date(2023, 4, 24), 1),
+        (date(2023, 4, 17), 1),
+    ]
@@ -3,7 +3,7 @@ from datetime import date, datetime
 
 import pytest
 
-from app.exceptions import NotFoundError
+from app.exceptions import AlreadyExistsError, NotFoundError
 from app.repositories.matches.repo import MatchRepository
 
 
@@ -23,3 +23,32 @@ def test_match_repository_get_by_match_date(home_match):
     match_repo.assets = [match, match]
     with pytest.raises(AssertionError):
         match_repo.get_by_match_date(datetime.now().date())
+
+
+def test_match_repository_add_enforces_unique_match_date(home_match, away_match):
+    match_repo = MatchRepository()
+
+    match_repo.add(home_match)
+    assert away_match in match_repo
+
+    with pytest.raises(AlreadyExistsError):
+        match_repo.add(away_match)
+    assert match_repo.assets == [home_match]
+
+    match_repo.remove(home_match)
+    assert home_match not in match_repo
+    with pytest.raises(NotFoundError):
+        match_repo.get_by_match_date(home_match.match_date)
+
+
+def test_match_repository_get_page(home_match):
+    dates = [date(2023, 3, 3), date(2023, 1, 6), date(2023, 2, 10)]
+    match_repo = MatchRepository(assets=[home_match.copy(update={"match_date": match_date}) for match_date in dates])
+
+    assert [match.match_date for match in match_repo.get_page()] == sorted(dates, reverse=True)
+    assert [match.match_date for match in match_repo.get_page(offset=1, limit=1)] == [date(2023, 2, 10)]
+    assert [match.match_date for match in match_repo.get_page(end=date(2023, 2, 28))] == [
+        date(2023, 2, 10),
+        date(2023, 1, 6),
+    ]
+    assert not match_repo.get_page(start=date(2023, 4, 1))
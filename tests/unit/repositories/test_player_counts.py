@@ -0,0 +1,103 @@
+"""Unit tests for the player count repository."""
+# pylint: disable=missing-function-docstring
+import os
+from datetime import date
+from unittest.mock import patch
+
+from app.models.goals import CountType, Goal, Score
+from app.models.players import Player
+from app.repositories.base.repo import Operation
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.player_counts import PlayerCountRepository
+
+
+def _goal(order: int, scored_by: str, assisted_by: str = None) -> Goal:
+    return Goal(
+        match_date=date(2023, 4, 17), scored_by=scored_by, assisted_by=assisted_by, score=Score(home=order, away=0)
+    )
+
+
+def _leaderboard(repo: PlayerCountRepository, count_type: CountType) -> list[tuple[str, int]]:
+    return [(count.player.name, count.get(count_type)) for count in repo.get_leaderboard(count_type)]
+
+
+def test_counts_follow_saved_goals(tmp_path):
+    goal_repo = GoalRepository()
+
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        goal_repo.add(_goal(1, "Thijs", "Mark"))
+        goal_repo.add(_goal(2, "Mark", "Thijs"))
+        goal_repo.add(_goal(3, "Mark"))
+        count_repo = PlayerCountRepository.load()
+
+        assert _leaderboard(count_repo, CountType.GOAL) == [("Mark", 2), ("Thijs", 1)]
+        assert _leaderboard(count_repo, CountType.ASSIST) == [("Mark", 1), ("Thijs", 1)]
+
+        goal_repo.remove(_goal(3, "Mark"))
+        goal_repo.remove(_goal(2, "Mark", "Thijs"))
+        count_repo = PlayerCountRepository.load()
+
+    assert _leaderboard(count_repo, CountType.GOAL) == [("Thijs", 1), ("Mark", 0)]
+    assert _leaderboard(count_repo, CountType.ASSIST) == [("Mark", 1), ("Thijs", 0)]
+
+
+def test_counts_rebuilt_from_goals_when_missing(tmp_path):
+    goal_repo = GoalRepository(assets=[_goal(1, "Thijs"), _goal(2, "Thijs")])
+
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        goal_repo.add(_goal(3, "Mark"))
+        count_repo = PlayerCountRepository.load()
+
+    assert _leaderboard(count_repo, CountType.GOAL) == [("Thijs", 2), ("Mark", 1)]
+    assert count_repo.get_leaderboard(CountType.GOAL)[0].player == Player(name="Thijs")
+
+
+def test_counts_not_shared_with_loaded_copies(tmp_path):
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        GoalRepository().add(_goal(1, "Thijs"))
+        PlayerCountRepository.load().apply_changes([(Operation.ADD, _goal(2, "Thijs"))])
+        count_repo = PlayerCountRepository.load()
+
+    assert _leaderboard(count_repo, CountType.GOAL) == [("Thijs", 1)]
+
+
+def test_counts_rebuilt_after_failed_update(tmp_path):
+    goal_repo = GoalRepository()
+
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        goal_repo.add(_goal(1, "Thijs"))
+        with patch.object(PlayerCountRepository, "save", side_effect=OSError("disk full")):
+            goal_repo.add(_goal(2, "Mark"))
+        assert _leaderboard(PlayerCountRepository.load(), CountType.GOAL) == [("Thijs", 1)]
+
+        goal_repo.add(_goal(3, "Mark"))
+        count_repo = PlayerCountRepository.load()
+
+    assert _leaderboard(count_repo, CountType.GOAL) == [("Mark", 2), ("Thijs", 1)]
+    assert count_repo.version == goal_repo.version
+
+
+def test_counts_of_the_same_version_counted_again(tmp_path):
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        GoalRepository().add(_goal(1, "Mark"))
+        goal_repo = GoalRepository()
+        goal_repo.add(_goal(1, "Thijs"))
+        count_repo = PlayerCountRepository.load()
+
+    assert _leaderboard(count_repo, CountType.GOAL) == [("Thijs", 1)]
+
+
+def test_counts_ahead_of_the_goals_counted_again(tmp_path):
+    with patch.dict(os.environ, {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}):
+        goal_repo = GoalRepository()
+        goal_repo.add(_goal(1, "Thijs"))
+        goal_repo.add(_goal(2, "Thijs"))
+        goal_repo.add(_goal(3, "Thijs"))
+
+        # The goals are restored to an earlier version, without the goals the counts were last updated with
+        GoalRepository(assets=[_goal(1, "Thijs")], version=1).save()
+        GoalRepository.load().add(_goal(2, "Mark"))
+        count_repo = PlayerCountRepository.load()
+
+    assert _leaderboard(count_repo, CountType.GOAL) == [("Mark", 1), ("Thijs", 1)]
+    assert count_repo.version == 2
@@ -0,0 +1,18 @@
+"""Unit tests for the player repository."""
+# pylint: disable=missing-function-docstring
+from app.models.players import Player
+from app.repositories.players import PlayerRepository
+
+
+def test_contains_ignores_capitalization():
+    repo = PlayerRepository(assets=[Player(name="Thijs")])
+
+    assert Player(name="thijs") in repo
+    assert Player(name="Mark") not in repo
+
+    repo.add(Player(name="Mark"))
+    assert Player(name="MARK") in repo
+
+    repo.remove(Player(name="mark"))
+    assert Player(name="Mark") not in repo
+    assert repo.assets == [Player(name="Thijs")]
@@ -0,0 +1,31 @@
+# pylint: disable=missing-function-docstring
+import os
+from datetime import date
+from unittest.mock import patch
+
+from app.models.goals import Goal, Score
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.sharded_migration import migrate_json_to_shards
+
+
+def test_migrate_json_to_shards(tmp_path, home_goal):
+    environ = {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}
+    earlier_goal = Goal(match_date=date(2023, 4, 17), scored_by=None, score=Score(home=0, away=1))
+
+    with patch.dict(os.environ, {**environ, "STORAGE_MODE": "journal"}):
+        goal_repo = GoalRepository.load()
+        goal_repo.add(home_goal)
+        goal_repo.add(earlier_goal)
+
+        migrated = migrate_json_to_shards()
+
+        with patch.dict(os.environ, {"STORAGE_MODE": "sharded"}):
+            GoalRepository.clear_cache()
+            goal_repo = GoalRepository.load()
+            shard = GoalRepository.load_shard("2023-04-17")
+
+    assert migrated == {"goals.json": 2}
+    assert goal_repo.assets == [earlier_goal, home_goal]
+    assert goal_repo.version == 2
+    assert shard.assets == [earlier_goal]
+    assert (tmp_path / "goals" / "index.json").exists()
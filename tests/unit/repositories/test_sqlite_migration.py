@@ -0,0 +1,28 @@
+# pylint: disable=missing-function-docstring
+import os
+from unittest.mock import patch
+
+from app.models.players import Player
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.player_counts import PlayerCountRepository
+from app.repositories.players import PlayerRepository
+from app.repositories.sqlite_migration import migrate_json_to_sqlite
+
+
+def test_migrate_json_to_sqlite(tmp_path, home_goal, away_goal):
+    environ = {"LOCAL_ACCESS": "true", "local_assets_dir": str(tmp_path)}
+
+    with patch.dict(os.environ, environ):
+        PlayerRepository(assets=[Player(name="Thijs"), Player(name="Mark")]).save()
+        GoalRepository(assets=[home_goal, away_goal]).save()
+
+        migrated = migrate_json_to_sqlite()
+
+        with patch.dict(os.environ, {"STORAGE_MODE": "sqlite"}):
+            GoalRepository.clear_cache()
+            goal_repo = GoalRepository.load()
+            count_repo = PlayerCountRepository.load()
+
+    assert migrated == {"players.json": 2, "goals.json": 2}
+    assert goal_repo.assets == [home_goal, away_goal]
+    assert not count_repo.is_stored()
@@ -1,11 +1,24 @@
 """Unit tests for the goals router."""
 # pylint: disable=missing-function-docstring
 import os
+from datetime import date
+from functools import partial
 from unittest.mock import patch
 
+import anyio
+import httpx
+import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
+from app.models.goals import Goal
+from app.models.matches import Match
+from app.models.players import Player
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.matches.repo import MatchRepository
+from app.repositories.players import PlayerRepository
+from app.s3 import S3AssetBucket
+from benchmarks.fake_s3 import FakeS3Client
 
 client = TestClient(app)
 
@@ -30,3 +43,147 @@ def test_get_by_match_date_authorized():
     with patch.dict(os.environ, {"api_key_read_access": "READ", "local_access": "True"}):
         response = client.get(f"{_GOALS_URL}2023-03-03", headers=headers)
     assert response.status_code == 200
+
+
+@pytest.fixture(name="write_environ")
+def write_environ_fixture(tmp_path):
+    environ = {"api_key_write_access": "WRITE", "local_access": "True", "local_assets_dir": str(tmp_path)}
+    with patch.dict(os.environ, environ):
+        PlayerRepository(assets=[Player(name="Thijs"), Player(name="Mark")]).save()
+        MatchRepository(assets=[Match(match_date="2023-03-03", opponent="Opponent", is_home=False)]).save()
+        yield environ
+
+
+def test_add_goals_in_batch(write_environ):
+    headers = {"ApiKey": "WRITE"}
+    goals = [
+        {"match_date": "2023-03-03", "scored_by": "Thijs", "assisted_by": "Mark"},
+        {"match_date": "2023-03-03"},
+        {"match_date": "2023-03-03", "scored_by": "Mark"},
+    ]
+
+    with patch.dict(os.environ, write_environ):
+        response = client.post(f"{_GOALS_URL}batch", json=goals, headers=headers)
+        goal_repo = GoalRepository.load()
+
+    assert response.status_code == 201
+    assert [goal["score"] for goal in response.json()] == [
+        {"home": 0, "away": 1},
+        {"home": 1, "away": 1},
+        {"home": 1, "away": 2},
+    ]
+    assert len(goal_repo.get_by_match_date(date(2023, 3, 3))) == 3
+
+
+def test_add_goal_scored_again_after_write_conflict(write_environ):
+    headers = {"ApiKey": "WRITE"}
+    environ = {**write_environ, "s3_access": "True", "s3_bucket_name": "bucket"}
+    load = GoalRepository.load
+
+    def load_while_another_writer_adds_a_goal():
+        goal_repo = load()
+        if len(other_writes) == 0:
+            other_writes.append(Goal(match_date="2023-03-03", scored_by="Mark", score={"home": 0, "away": 1}))
+            load().add(other_writes[0])
+        return goal_repo
+
+    other_writes = []
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", FakeS3Client()):
+        with patch.object(GoalRepository, "load", side_effect=load_while_another_writer_adds_a_goal):
+            response = client.post(_GOALS_URL, json={"match_date": "2023-03-03", "scored_by": "Thijs"}, headers=headers)
+        GoalRepository.clear_cache()
+        goal_repo = GoalRepository.load()
+
+    assert response.status_code == 201
+    assert response.json()["score"] == {"home": 0, "away": 2}
+    assert [goal.score.away for goal in goal_repo.get_by_match_date(date(2023, 3, 3))] == [1, 2]
+
+
+def test_add_goals_concurrently(write_environ):
+    goal = {"match_date": "2023-03-03", "scored_by": "Thijs"}
+
+    async def add_goals():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client_, anyio.create_task_group() as tasks:
+            for _ in range(10):
+                tasks.start_soon(partial(client_.post, "/goals", json=goal, headers={"ApiKey": "WRITE"}))
+
+    with patch.dict(os.environ, write_environ):
+        anyio.run(add_goals)
+        goal_repo = GoalRepository.load()
+
+    assert [goal.score.away for goal in goal_repo.get_by_match_date(date(2023, 3, 3))] == list(range(1, 11))
+
+
+def test_add_goals_in_batch_rolls_back_on_invalid_goal(write_environ):
+    headers = {"ApiKey": "WRITE"}
+    goals = [
+        {"match_date": "2023-03-03", "scored_by": "Thijs"},
+        {"match_date": "2023-03-03", "scored_by": "Unknown"},
+    ]
+
+    with patch.dict(os.environ, write_environ):
+        response = client.post(f"{_GOALS_URL}batch", json=goals, headers=headers)
+        goal_repo = GoalRepository.load()
+
+    assert response.status_code == 409
+    assert "A player named Unknown does not exist" in response.text
+    assert not goal_repo.assets
+
+
+def test_get_by_match_date_not_modified(write_environ):
+    headers = {"ApiKey": "WRITE"}
+
+    with patch.dict(os.environ, write_environ):
+        client.post(_GOALS_URL, json={"match_date": "2023-03-03", "scored_by": "Thijs"}, headers=headers)
+        response = client.get(f"{_GOALS_URL}2023-03-03", headers=headers)
+        etag = response.headers["ETag"]
+
+        with patch.object(GoalRepository, "load") as load:
+            not_modified = client.get(f"{_GOALS_URL}2023-03-03", headers={**headers, "If-None-Match": etag})
+        assert load.call_count == 0
+
+        client.post(_GOALS_URL, json={"match_date": "2023-03-03"}, headers=headers)
+        modified = client.get(f"{_GOALS_URL}2023-03-03", headers={**headers, "If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert modified.status_code == 200
+    assert modified.headers["ETag"] != etag
+    assert len(modified.json()) == 2
+
+
+def test_get_by_match_date_serves_cached_response(write_environ):
+    headers = {"ApiKey": "WRITE"}
+
+    with patch.dict(os.environ, write_environ):
+        client.post(_GOALS_URL, json={"match_date": "2023-03-03", "scored_by": "Thijs"}, headers=headers)
+        response = client.get(f"{_GOALS_URL}2023-03-03", headers=headers)
+
+        with patch.object(GoalRepository, "load") as load:
+            cached = client.get(f"{_GOALS_URL}2023-03-03", headers=headers)
+        assert load.call_count == 0
+
+        client.post(_GOALS_URL, json={"match_date": "2023-03-03"}, headers=headers)
+        modified = client.get(f"{_GOALS_URL}2023-03-03", headers=headers)
+
+    assert cached.status_code == 200
+    assert cached.content == response.content
+    assert cached.headers["ETag"] == response.headers["ETag"]
+    assert response.json()[0]["is_team_goal"] is True
+    assert len(modified.json()) == 2
+
+
+def test_list_goals_paged(write_environ):
+    headers = {"ApiKey": "WRITE"}
+    environ = {**write_environ, "api_key_read_access": "READ"}
+
+    with patch.dict(os.environ, environ):
+        for _ in range(3):
+            client.post(_GOALS_URL, json={"match_date": "2023-03-03"}, headers=headers)
+        response = client.get("goals", params={"offset": 1, "limit": 1}, headers={"ApiKey": "READ"})
+        outside_range = client.get("goals", params={"from": "2023-03-04"}, headers={"ApiKey": "READ"})
+
+    assert response.status_code == 200
+    assert [goal["order"] for goal in response.json()] == [2]
+    assert outside_range.json() == []
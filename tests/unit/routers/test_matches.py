@@ -0,0 +1,66 @@
+"""Unit tests for the matches router."""
+# pylint: disable=missing-function-docstring
+import os
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.goals import Goal
+from app.models.matches import Match
+from app.repositories.goals.repo import GoalRepository
+from app.repositories.matches.repo import MatchRepository
+
+client = TestClient(app)
+
+
+_MATCHES_URL = "matches/"
+
+
+@pytest.fixture(name="read_environ")
+def read_environ_fixture(tmp_path):
+    environ = {"local_assets_dir": str(tmp_path), "api_key_read_access": "READ", "local_access": "True"}
+    with patch.dict(os.environ, environ):
+        MatchRepository(assets=[Match(match_date="2023-03-03", opponent="Opponent", is_home=True)]).save()
+        GoalRepository(
+            assets=[
+                Goal(match_date="2023-03-03", scored_by="Thijs", assisted_by="Mark", score="1-0"),
+                Goal(match_date="2023-03-03", score="1-1"),
+            ]
+        ).save()
+        yield environ
+
+
+def test_get_timeline_no_api_key():
+    response = client.get(f"{_MATCHES_URL}2023-03-03/timeline")
+    assert response.status_code == 401
+
+
+def test_get_timeline(read_environ):
+    headers = {"ApiKey": "READ"}
+
+    with patch.dict(os.environ, read_environ):
+        response = client.get(f"{_MATCHES_URL}2023-03-03/timeline", headers=headers)
+        not_modified = client.get(
+            f"{_MATCHES_URL}2023-03-03/timeline", headers={**headers, "If-None-Match": response.headers["ETag"]}
+        )
+
+    assert response.status_code == 200
+    timeline = response.json()
+    assert [(goal["order"], goal["is_team_goal"], goal["score"]) for goal in timeline["goals"]] == [
+        (1, True, {"home": 1, "away": 0}),
+        (2, False, {"home": 1, "away": 1}),
+    ]
+    assert [(count["player"]["name"], count["goals"], count["assists"]) for count in timeline["player_counts"]] == [
+        ("Thijs", 1, 0),
+        ("Mark", 0, 1),
+    ]
+    assert (timeline["score"], timeline["result"]) == ({"home": 1, "away": 1}, "draw")
+    assert not_modified.status_code == 304
+
+
+def test_get_timeline_of_unknown_match(read_environ):
+    with patch.dict(os.environ, read_environ):
+        response = client.get(f"{_MATCHES_URL}2023-03-04/timeline", headers={"ApiKey": "READ"})
+    assert response.status_code == 404
@@ -0,0 +1,27 @@
+"""Unit tests for the players router."""
+# pylint: disable=missing-function-docstring
+import os
+from functools import partial
+from unittest.mock import patch
+
+import anyio
+import httpx
+
+from app.main import app
+from app.repositories.players import PlayerRepository
+
+
+def test_add_players_concurrently(tmp_path):
+    environ = {"api_key_write_access": "WRITE", "local_access": "True", "local_assets_dir": str(tmp_path)}
+    names = [f"Player {number}" for number in range(20)]
+
+    async def add_players():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client, anyio.create_task_group() as tasks:
+            for name in names:
+                tasks.start_soon(partial(client.post, "/players", json={"name": name}, headers={"ApiKey": "WRITE"}))
+
+    with patch.dict(os.environ, environ):
+        anyio.run(add_players)
+        players = PlayerRepository.load()
+
+    assert sorted(player.name for player in players.assets) == sorted(names)
@@ -0,0 +1,47 @@
+"""Unit tests for the settings provider."""
+# pylint: disable=missing-function-docstring
+import os
+from unittest.mock import Mock, patch
+
+from app.settings.provider import SettingsProvider
+from app.settings.repository import RepositorySettings
+
+
+def test_settings_are_read_once():
+    factory = Mock(side_effect=RepositorySettings)
+    provider = SettingsProvider(RepositorySettings, factory=factory)
+
+    first = provider.get()
+    second = provider.get()
+
+    assert first is second
+    assert factory.call_count == 1
+
+    assert provider.reload() is not first
+    assert factory.call_count == 2
+
+
+def test_settings_reloaded_on_environment_change():
+    provider = SettingsProvider(RepositorySettings)
+
+    with patch.dict(os.environ, {"S3_BUCKET_NAME": "first-bucket"}):
+        assert provider.get().s3_bucket_name == "first-bucket"
+    with patch.dict(os.environ, {"s3_bucket_name": "second-bucket"}):
+        assert provider.get().s3_bucket_name == "second-bucket"
+
+
+def test_settings_reloaded_on_env_file_change(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    provider = SettingsProvider(RepositorySettings)
+    assert provider.get().s3_bucket_name == ""
+
+    (tmp_path / ".env").write_text("S3_BUCKET_NAME=env-file-bucket\n")
+    assert provider.get().s3_bucket_name == "env-file-bucket"
+
+
+def test_settings_override():
+    provider = SettingsProvider(RepositorySettings)
+
+    with provider.override(s3_bucket_name="override-bucket"):
+        assert provider.get().s3_bucket_name == "override-bucket"
+    assert provider.get().s3_bucket_name == ""
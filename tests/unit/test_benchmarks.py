@@ -0,0 +1,29 @@
+"""Unit tests for the benchmarks."""
+# pylint: disable=missing-function-docstring
+import os
+from unittest.mock import patch
+
+from app.repositories.goals.repo import GoalRepository
+from app.s3 import S3AssetBucket
+from benchmarks.fake_s3 import FakeS3Client
+from benchmarks.repositories import generate_dataset, run_benchmarks
+
+
+def test_benchmarks_run_on_generated_dataset(tmp_path):
+    s3_client = FakeS3Client()
+    environ = {
+        "LOCAL_ACCESS": "True",
+        "LOCAL_ASSETS_DIR": str(tmp_path),
+        "S3_ACCESS": "True",
+        "S3_BUCKET_NAME": "benchmark",
+        "API_KEY_WRITE_ACCESS": "benchmark",
+    }
+
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_shared_client", s3_client):
+        generate_dataset(players=3, matches=4, goals=20)
+        results = run_benchmarks(runs=1)
+        goal_repo = GoalRepository.load()
+
+    assert len(goal_repo.assets) == 20
+    assert {"goals.load", "goals.add", "goals.remove", "goals.save", "api.post_goal"} <= results.keys()
+    assert ("benchmark", "assets/goals.json") in s3_client.objects
@@ -0,0 +1,57 @@
+"""Unit tests for the concurrency module."""
+# pylint: disable=missing-function-docstring
+import threading
+from contextvars import ContextVar
+
+import anyio
+
+from app.concurrency import run_blocking, write_lock
+
+_request_id: ContextVar[str] = ContextVar("request_id")
+
+
+def _current_thread_and_request() -> tuple[int, str]:
+    return threading.get_ident(), _request_id.get()
+
+
+def test_run_blocking_in_worker_thread_with_context():
+    async def main():
+        _request_id.set("request")
+        return await run_blocking(_current_thread_and_request)
+
+    thread_id, request_id = anyio.run(main)
+
+    assert thread_id != threading.get_ident()
+    assert request_id == "request"
+
+
+def test_run_blocking_overlaps_calls():
+    barrier = threading.Barrier(2, timeout=5)
+
+    async def main():
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(run_blocking, barrier.wait)
+            task_group.start_soon(run_blocking, barrier.wait)
+
+    anyio.run(main)
+
+
+def test_write_lock_serializes_writers_per_key():
+    events = []
+
+    async def write(key: str, name: str):
+        async with write_lock(key):
+            events.append(f"{name} started")
+            await anyio.sleep(0.01)
+            events.append(f"{name} finished")
+
+    async def main():
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(write, "goals", "first")
+            task_group.start_soon(write, "goals", "second")
+            task_group.start_soon(write, "players", "other")
+
+    anyio.run(main)
+
+    assert events.index("first finished") < events.index("second started")
+    assert events.index("other started") < events.index("first finished")
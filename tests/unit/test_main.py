@@ -0,0 +1,24 @@
+"""Unit tests for the main module."""
+# pylint: disable=missing-function-docstring
+from unittest.mock import patch
+
+from app.main import handler
+from app.s3 import S3AssetBucket
+from benchmarks.import_time import LAZY_MODULES, measure_import_time
+
+
+def test_import_does_not_load_lazy_modules():
+    import_times = measure_import_time("app.main")
+
+    assert "app.main" in import_times
+    assert not set(LAZY_MODULES) & import_times.keys()
+
+
+def test_handler_flushes_deferred_uploads():
+    with patch("app.main._mangum_handler", return_value={"statusCode": 200}) as mangum_handler, patch.object(
+        S3AssetBucket, "flush_uploads"
+    ) as flush_uploads:
+        assert handler({}, None) == {"statusCode": 200}
+
+    mangum_handler.assert_called_once_with({}, None)
+    flush_uploads.assert_called_once_with()
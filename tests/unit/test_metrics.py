@@ -0,0 +1,53 @@
+"""Unit tests for the metrics module."""
+# pylint: disable=missing-function-docstring
+import os
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import Histogram, timed
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_duration_seconds", "Test durations.", "phase")
+
+    histogram.observe("load", 0.003)
+    histogram.observe("load", 0.2)
+    histogram.observe("load", 20)
+
+    lines = histogram.render()
+    assert "# TYPE test_duration_seconds histogram" in lines
+    assert 'test_duration_seconds_bucket{phase="load",le="0.001"} 0' in lines
+    assert 'test_duration_seconds_bucket{phase="load",le="0.005"} 1' in lines
+    assert 'test_duration_seconds_bucket{phase="load",le="0.25"} 2' in lines
+    assert 'test_duration_seconds_bucket{phase="load",le="+Inf"} 3' in lines
+    assert 'test_duration_seconds_count{phase="load"} 3' in lines
+
+
+def test_timed_phase_is_counted_without_request():
+    with patch("app.metrics.phase_durations") as phase_durations:
+        with timed("test_phase"):
+            pass
+
+    assert phase_durations.observe.call_args.args[0] == "test_phase"
+
+
+def test_server_timing_and_metrics(tmp_path):
+    headers = {"ApiKey": "READ"}
+    environ = {"api_key_read_access": "READ", "local_access": "True", "local_assets_dir": str(tmp_path)}
+
+    with patch.dict(os.environ, environ):
+        (tmp_path / "players.json").write_text('{"assets": [{"name": "Thijs"}]}', encoding="utf-8")
+        response = client.get("players", headers=headers)
+        metrics = client.get("metrics", headers=headers)
+
+    server_timing = response.headers["Server-Timing"]
+    assert "json_read;dur=" in server_timing
+    assert "model_parse;dur=" in server_timing
+    assert "total;dur=" in server_timing
+    assert metrics.headers["Content-Type"].startswith("text/plain")
+    assert 'futsta_phase_duration_seconds_count{phase="model_parse"}' in metrics.text
+    assert 'futsta_request_duration_seconds_count{route="list_players"}' in metrics.text
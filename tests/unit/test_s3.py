@@ -1,9 +1,23 @@
 """Unit tests for the S3 module."""
 # pylint: disable=missing-function-docstring
+import io
+import json
 import os
-from unittest.mock import Mock, patch
+import threading
+from unittest.mock import MagicMock, Mock, patch
 
-from app.s3 import S3AssetBucket
+import boto3
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+
+from app.exceptions import WriteConflictError
+from app.s3 import S3AssetBucket, _support_conditional_writes
+from benchmarks.fake_s3 import FakeS3Client
+
+
+def _not_modified_error():
+    return ClientError({"Error": {"Code": "304"}, "ResponseMetadata": {"HTTPStatusCode": 304}}, "GetObject")
 
 
 def test_download_no_access():
@@ -15,18 +29,270 @@ def test_download_no_access():
     bucket.download_asset(file_name)
     bucket.upload_asset(file_name)
 
-    assert client.download_file.call_count == 0
+    assert client.get_object.call_count == 0
+    assert client.put_object.call_count == 0
 
 
-def test_download_with_access():
-    client = Mock()
+def test_download_with_access(tmp_path):
+    client = MagicMock()
+    client.get_object.return_value = {"Body": io.BytesIO(b"content"), "ETag": '"etag"'}
+    client.put_object.return_value = {"ETag": '"new-etag"'}
+    file_name = "test-file"
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    with patch.dict(os.environ, {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path)}):
+        bucket.download_asset(file_name)
+        bucket.upload_asset(file_name)
+        assert bucket.get_known_etags([file_name, "other-file"]) == {file_name: '"new-etag"'}
+
+    assert client.get_object.call_count == 1
+    assert client.put_object.call_count == 1
+    assert (tmp_path / file_name).read_bytes() == b"content"
+
+
+def test_download_not_modified(tmp_path):
+    client = MagicMock()
+    client.get_object.return_value = {"Body": io.BytesIO(b"content"), "ETag": '"etag"'}
+    file_name = "test-file"
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    with patch.dict(os.environ, {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path)}):
+        bucket.download_asset(file_name)
+        client.get_object.side_effect = _not_modified_error()
+        bucket.download_asset(file_name)
+
+    assert "IfNoneMatch" not in client.get_object.call_args_list[0].kwargs
+    assert client.get_object.call_args_list[1].kwargs["IfNoneMatch"] == '"etag"'
+    assert (tmp_path / file_name).read_bytes() == b"content"
+
+
+def test_download_unconditional_without_local_copy(tmp_path):
+    client = MagicMock()
+    client.get_object.return_value = {"Body": io.BytesIO(b"content"), "ETag": '"etag"'}
+    file_name = "test-file"
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    with patch.dict(os.environ, {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path)}):
+        bucket.download_asset(file_name)
+        (tmp_path / file_name).unlink()
+        client.get_object.return_value = {"Body": io.BytesIO(b"content"), "ETag": '"etag"'}
+        bucket.download_asset(file_name)
+
+    assert "IfNoneMatch" not in client.get_object.call_args_list[1].kwargs
+    assert (tmp_path / file_name).read_bytes() == b"content"
+
+
+def test_shared_client_is_created_once():
+    with patch("boto3.client") as boto3_client, patch.object(S3AssetBucket, "_shared_client", None):
+        first = S3AssetBucket(bucket_name="test-bucket")
+        second = S3AssetBucket(bucket_name="other-bucket")
+        assert first.s3_client is second.s3_client
+
+    assert boto3_client.call_count == 1
+
+
+def test_conditional_upload(tmp_path):
+    client = FakeS3Client()
+    file_name = "test-file"
+    (tmp_path / file_name).write_bytes(b"content")
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    with patch.dict(os.environ, {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path)}):
+        bucket.download_asset(file_name, missing_ok=True)
+        assert bucket.get_known_etags([file_name]) == {file_name: None}
+
+        bucket.upload_asset(file_name, conditional=True)
+        etag = bucket.get_known_etags([file_name])[file_name]
+        with pytest.raises(WriteConflictError):
+            bucket.upload_asset(file_name, conditional=True)
+        assert not bucket.get_known_etags([file_name])
+
+        bucket.upload_asset(file_name, conditional=True, expected_etag=etag)
+        with pytest.raises(WriteConflictError):
+            bucket.upload_asset(file_name, conditional=True, expected_etag='"outdated"')
+
+
+def test_failed_upload_downloaded_again(tmp_path):
+    client = FakeS3Client()
+    file_name = "test-file"
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    with patch.dict(os.environ, {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path)}):
+        (tmp_path / file_name).write_bytes(b"stored")
+        bucket.upload_asset(file_name)
+
+        (tmp_path / file_name).write_bytes(b"failed")
+        server_error = ClientError({"Error": {"Code": "500"}, "ResponseMetadata": {"HTTPStatusCode": 500}}, "PutObject")
+        with patch.object(client, "put_object", side_effect=server_error), pytest.raises(ClientError):
+            bucket.upload_asset(
+                file_name, conditional=True, expected_etag=bucket.get_known_etags([file_name])[file_name]
+            )
+        assert not bucket.get_known_etags([file_name])
+
+        bucket.download_asset(file_name)
+    assert (tmp_path / file_name).read_bytes() == b"stored"
+
+
+def test_write_conditions_sent_as_headers():
+    client = boto3.client("s3", region_name="eu-west-1", aws_access_key_id="key", aws_secret_access_key="secret")
+    sent_headers = {}
+
+    def _send(request, **_kwargs):
+        sent_headers.update(request.headers)
+        return AWSResponse(request.url, 412, {}, Mock(stream=Mock(return_value=iter([b""]))))
+
+    client.meta.events.register("before-send.s3.PutObject", _send)
+    service_model = client.meta.service_model.operation_model("PutObject").input_shape
+    with patch.object(service_model, "members", {}):
+        _support_conditional_writes(client)
+
+    with pytest.raises(ClientError):
+        client.put_object(Bucket="test-bucket", Key="test-file", Body=b"content", IfMatch='"etag"')
+    assert sent_headers["If-Match"] == b'"etag"'
+
+
+def test_write_behind_coalesces_uploads(tmp_path):
+    client = FakeS3Client()
+    file_name = "test-file"
+    (tmp_path / file_name).write_bytes(b"first")
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    environ = {
+        "S3_ACCESS": "True",
+        "LOCAL_ASSETS_DIR": str(tmp_path),
+        "WRITE_BEHIND_WINDOW": "60",
+        "WRITE_BEHIND_MAX_WRITES": "3",
+    }
+    with patch.dict(os.environ, environ):
+        bucket.upload_asset(file_name)
+        (tmp_path / file_name).write_bytes(b"second")
+        bucket.upload_asset(file_name)
+        bucket.download_asset(file_name)
+        assert client.calls == {"get_object": 0, "put_object": 0}
+
+        bucket.upload_asset(file_name)
+        assert client.calls["put_object"] == 1
+
+        bucket.upload_asset(file_name)
+        S3AssetBucket.flush_uploads()
+        S3AssetBucket.flush_uploads()
+
+    assert client.calls["put_object"] == 2
+    assert client.objects[("test-bucket", f"assets/{file_name}")] == b"second"
+
+
+def test_write_behind_keeps_conflicting_upload(tmp_path, caplog):
+    client = FakeS3Client()
     file_name = "test-file"
+    (tmp_path / file_name).write_bytes(b"local")
 
     bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
 
-    with patch.dict(os.environ, {"S3_ACCESS": "True"}):
+    environ = {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path), "WRITE_BEHIND_WINDOW": "60"}
+    with patch.dict(os.environ, environ):
+        bucket.download_asset(file_name, missing_ok=True)
+        bucket.upload_asset(file_name)
+        client.objects[("test-bucket", f"assets/{file_name}")] = b"other writer"
+        S3AssetBucket.flush_uploads()
+
         bucket.download_asset(file_name)
+
+    assert client.objects[("test-bucket", f"assets/{file_name}")] == b"other writer"
+    assert (tmp_path / file_name).read_bytes() == b"other writer"
+    assert [dead_letter.read_bytes() for dead_letter in tmp_path.glob(f".dead_letters/*/{file_name}")] == [b"local"]
+    assert "Deferred upload of test-file conflicts with another writer" in caplog.text
+
+
+def test_outbox_survives_restart(tmp_path):
+    client = FakeS3Client()
+    file_name = "test-file"
+    (tmp_path / file_name).write_bytes(b"local")
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    environ = {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path), "UPLOAD_OUTBOX": "True"}
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_request_drain") as request_drain:
+        bucket.upload_asset(file_name)
+        assert request_drain.call_count == 1
+        assert client.calls["put_object"] == 0
+
+        # A new process only knows about the upload from the outbox, and uploads it before downloading
+        S3AssetBucket.reset_uploads()
+        with patch.object(S3AssetBucket, "shared_client", return_value=client):
+            bucket.download_asset(file_name)
+
+    assert client.calls == {"get_object": 1, "put_object": 1}
+    assert client.objects[("test-bucket", f"assets/{file_name}")] == b"local"
+    assert (tmp_path / file_name).read_bytes() == b"local"
+    assert not S3AssetBucket._pending_uploads  # pylint: disable=protected-access
+
+
+def test_outbox_retries_failed_uploads(tmp_path):
+    client = FakeS3Client()
+    file_name = "test-file"
+    (tmp_path / file_name).write_bytes(b"local")
+    uploaded = threading.Event()
+
+    def _put_object(**kwargs):
+        if client.calls["put_object"] == 0:
+            client.calls["put_object"] += 1
+            raise ClientError({"Error": {"Code": "500"}, "ResponseMetadata": {"HTTPStatusCode": 500}}, "PutObject")
+        response = FakeS3Client.put_object(client, **kwargs)
+        uploaded.set()
+        return response
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    environ = {
+        "S3_ACCESS": "True",
+        "LOCAL_ASSETS_DIR": str(tmp_path),
+        "UPLOAD_OUTBOX": "True",
+        "UPLOAD_RETRY_DELAY": "0.01",
+    }
+    with patch.dict(os.environ, environ), patch.object(client, "put_object", side_effect=_put_object):
+        bucket.upload_asset(file_name)
+        assert uploaded.wait(timeout=5)
+        with S3AssetBucket._pending_lock:  # pylint: disable=protected-access
+            assert not S3AssetBucket._pending_uploads  # pylint: disable=protected-access
+
+    assert client.calls["put_object"] == 2
+    assert client.objects[("test-bucket", f"assets/{file_name}")] == b"local"
+
+
+def test_outbox_keeps_conflicting_upload(tmp_path):
+    client = FakeS3Client()
+    file_name = "test-file"
+    (tmp_path / file_name).write_bytes(b"local")
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=client)
+
+    environ = {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path), "UPLOAD_OUTBOX": "True"}
+    with patch.dict(os.environ, environ), patch.object(S3AssetBucket, "_request_drain"):
+        bucket.download_asset(file_name, missing_ok=True)
+        client.objects[("test-bucket", f"assets/{file_name}")] = b"other writer"
+        bucket.upload_asset(file_name)
+        assert S3AssetBucket.flush_uploads()
+
+    assert [dead_letter.read_bytes() for dead_letter in tmp_path.glob(f".dead_letters/*/{file_name}")] == [b"local"]
+    assert not json.loads((tmp_path / ".outbox.json").read_text(encoding="utf-8"))
+
+
+def test_reset_uploads_stops_outbox_worker(tmp_path):
+    file_name = "test-file"
+    (tmp_path / file_name).write_bytes(b"local")
+
+    bucket = S3AssetBucket(bucket_name="test-bucket", client=FakeS3Client())
+
+    environ = {"S3_ACCESS": "True", "LOCAL_ASSETS_DIR": str(tmp_path), "UPLOAD_OUTBOX": "True"}
+    with patch.dict(os.environ, environ):
         bucket.upload_asset(file_name)
+        drain_worker = S3AssetBucket._drain_worker  # pylint: disable=protected-access
+        S3AssetBucket.reset_uploads()
 
-    assert client.download_file.call_count == 1
-    assert client.upload_file.call_count == 1
+    assert not drain_worker.is_alive()
+    assert S3AssetBucket._drain_worker is None  # pylint: disable=protected-access